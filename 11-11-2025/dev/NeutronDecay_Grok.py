@@ -1,10 +1,15 @@
 import numpy as np
+import matplotlib.pyplot as plt
 import random
 import time
 
+from ste_decay import DecayParams, balanced_repel, iter_blocks
+from ste_stats import DecayStats
+
 # Simulation Parameters
 CIRCUMFERENCE = 1.0
 NUM_TRIALS_FULL = 1000
+PROGRESS_EVERY = 100  # trials per block, one progress line each
 TIME_STEP_COARSE = 1.0
 TIME_STEP_FINE = 1e-6
 MAX_SIM_TIME = 10000.0
@@ -20,42 +25,46 @@ g_leak = g_jitter / 2 - drift  # ~1.59e-20
 COLLISION_DIST = 0.01
 g_attract = 4e-2
 g_drag = 1e-10
-g_repel = 0.0  # Initial global
+
+# Wait phase: "table" samples ignition times from the tabulated first-passage
+# law (fast, cached per parameter set); "step" steps the walk (for validation)
+WAIT_MODE = "table"
+
+# One immutable parameter set per run, shared by every trial
+PARAMS = DecayParams(attract=g_attract, drag=g_drag, jitter=g_jitter, leak=g_leak,
+                     crash_threshold=CRASH_THRESHOLD, repel=balanced_repel(g_attract, CIRCUMFERENCE),
+                     clamp=True, collision_dist=COLLISION_DIST, circumference=CIRCUMFERENCE,
+                     dt_coarse=TIME_STEP_COARSE, dt_fine=TIME_STEP_FINE, max_time=MAX_SIM_TIME)
 
 class NeutronSim:
-    def __init__(self):
-        self.pos1 = 0.0
-        self.pos2 = 0.5
+    def __init__(self, params=PARAMS, rng=None):
+        self.params = params
+        self.rng = rng if rng is not None else random.Random()
+        self.pos1, self.pos2 = params.start
         self.vel1 = 0.0
         self.vel2 = 0.0
         self.flare1_spin = 1
         self.flare2_spin = -1
         self.flare_energy = 0.0
         self.time = 0.0
-        self.time_step = TIME_STEP_COARSE
+        self.time_step = params.dt_coarse
         
-        global g_repel
-        initial_dist = self.distance()
-        initial_f_attract = g_attract / (initial_dist ** 2)
-        initial_f_repel_base = np.exp(-initial_dist / (CIRCUMFERENCE / 10))
-        if initial_f_repel_base > 0:
-            g_repel = initial_f_attract / initial_f_repel_base
-        else:
-            g_repel = 0
+        self.repel = params.repel  # per trial: balanced at start, 0 after ignition
 
     def distance(self):
         dist = abs(self.pos1 - self.pos2)
-        return min(dist, CIRCUMFERENCE - dist)
+        return min(dist, self.params.circumference - dist)
 
     def forces(self):
+        p = self.params
         dist = self.distance()
         if dist == 0: dist = 1e-20
         
-        f_attract = g_attract / (dist ** 2)
+        f_attract = p.attract / (dist ** 2)
         dir1 = 1 if self.pos2 > self.pos1 else -1
         dir2 = -dir1
         
-        f_repel = g_repel * np.exp(-dist / (CIRCUMFERENCE / 10))
+        f_repel = self.repel * np.exp(-dist / (p.circumference / 10))
         
         f1 = f_attract * dir1 - f_repel * dir1
         f2 = f_attract * dir2 - f_repel * dir2
@@ -63,74 +72,86 @@ class NeutronSim:
         return f1, f2
 
     def step(self):
+        p = self.params
         f1, f2 = self.forces()
         
-        self.vel1 += (f1 - g_drag * self.vel1) * self.time_step
-        self.vel2 += (f2 - g_drag * self.vel2) * self.time_step
+        self.vel1 += (f1 - p.drag * self.vel1) * self.time_step
+        self.vel2 += (f2 - p.drag * self.vel2) * self.time_step
         
-        self.pos1 = (self.pos1 + self.vel1 * self.time_step) % CIRCUMFERENCE
-        self.pos2 = (self.pos2 + self.vel2 * self.time_step) % CIRCUMFERENCE
+        self.pos1 = (self.pos1 + self.vel1 * self.time_step) % p.circumference
+        self.pos2 = (self.pos2 + self.vel2 * self.time_step) % p.circumference
         
         self.time += self.time_step
 
-    def run(self):
-        self.time_step = TIME_STEP_COARSE
-        while self.time < MAX_SIM_TIME:
-            p_in = abs(random.uniform(-g_jitter, g_jitter))
-            p_out = g_leak
+    def wait(self):
+        p = self.params
+        self.time_step = p.dt_coarse
+        while self.time < p.max_time:
+            p_in = abs(self.rng.uniform(-p.jitter, p.jitter))
+            p_out = p.leak
             net_charge = p_in - p_out
             self.flare_energy += net_charge
             if self.flare_energy < 0:
                 self.flare_energy = 0.0
-            if self.flare_energy > CRASH_THRESHOLD:
-                global g_repel
-                g_repel = 0.0
+            if self.flare_energy > p.crash_threshold:
+                self.repel = 0.0
                 break
             self.time += self.time_step
-        
-        if self.flare_energy <= CRASH_THRESHOLD:
-            return None
-        
-        self.time_step = TIME_STEP_FINE
-        crash_timeout = self.time + 10.0
+        return self.flare_energy > p.crash_threshold
+
+    def crash(self):
+        p = self.params
+        self.time_step = p.dt_fine
+        crash_timeout = self.time + p.crash_timeout
         while self.time < crash_timeout:
             self.step()
-            if self.distance() < COLLISION_DIST:
+            if self.distance() < p.collision_dist:
                 return self.time
         
         return None
 
+    def run(self):
+        if not self.wait():
+            return None
+        return self.crash()
+
 def run_trial(_):
     sim = NeutronSim()
     return sim.run()
 
 # --- MAIN EXECUTION ---
 print(f"Running with {NUM_TRIALS_FULL} trials...")
-decay_times = []
 start_time = time.time()
 
-for i in range(NUM_TRIALS_FULL):
-    dt = run_trial(i)
-    if dt is not None:
-        decay_times.append(dt)
-    if (i + 1) % 100 == 0:
-        print(f"Progress: { (i+1) / NUM_TRIALS_FULL *100:.1f}% , Decays: {len(decay_times)}")
+# Wait (clamped at zero) and crash phases, PROGRESS_EVERY trials at a time in
+# this process (see ste_decay.py), summarized as they arrive (see ste_stats.py)
+stats = DecayStats(range=(0.0, PARAMS.max_time + PARAMS.crash_timeout))
+for lo, block_times in iter_blocks(NUM_TRIALS_FULL, PARAMS, workers=0, block=PROGRESS_EVERY,
+                                   wait=WAIT_MODE):
+    stats.update(block_times)
+    done = lo + len(block_times)
+    if stats.count:
+        print(f"Progress: {done / NUM_TRIALS_FULL * 100:.1f}% , Decays: {stats.count}, Mean: {stats.mean:.2f} s")
+    else:
+        print(f"Progress: {done / NUM_TRIALS_FULL * 100:.1f}% , Decays: 0")
+print(f"Decays: {stats.count} of {NUM_TRIALS_FULL}")
 
 end_time = time.time()
 print(f"Finished in {end_time - start_time:.2f} seconds.")
 
-if decay_times:
-    mean_life_sim = np.mean(decay_times)
-    half_life_sim = np.median(decay_times)
-    std_life = np.std(decay_times)
+if stats.count:
+    mean_life_sim = stats.mean
+    half_life_sim = stats.median()
+    std_life = stats.std
     print(f"Simulated Mean Lifetime: {mean_life_sim / 60:.2f} minutes (std: {std_life / 60:.2f} min, CV: {std_life / mean_life_sim:.2f})")
     print(f"Target Mean: {MEAN_LIFETIME_TARGET / 60:.2f} minutes")
     print(f"Simulated Half-Life (median): {half_life_sim / 60:.2f} minutes")
     print(f"Target Half-Life: {HALF_LIFE_TARGET / 60:.2f} minutes")
     error_mean = abs(mean_life_sim - MEAN_LIFETIME_TARGET) / MEAN_LIFETIME_TARGET * 100
     print(f"Mean Error: {error_mean:.2f}%")
-    print(f"Min: {np.min(decay_times):.2f} s, Max: {np.max(decay_times):.2f} s")
-    plt.hist(decay_times, bins=50, alpha=0.7, label='Decay Times')
+    print(f"Min: {stats.min:.2f} s, Max: {stats.max:.2f} s")
+    counts, edges = stats.histogram(bins=50)
+    plt.hist(edges[:-1], bins=edges, weights=counts, alpha=0.7, label='Decay Times')
     plt.axvline(mean_life_sim, color='green', linestyle='--', label=f'Mean: {mean_life_sim/60:.2f} min')
     plt.axvline(half_life_sim, color='orange', linestyle='--', label=f'Median: {half_life_sim/60:.2f} min')
     plt.axvline(MEAN_LIFETIME_TARGET, color='red', linestyle='--', label='Target Mean')
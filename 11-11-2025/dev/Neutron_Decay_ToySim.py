@@ -1,9 +1,13 @@
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 import random
 import time
 import multiprocessing
 
+from ste_decay import DecayParams, balanced_repel, iter_blocks
+from ste_stats import DecayStats
+
 # Simulation Parameters
 CIRCUMFERENCE = 1.0
 NUM_TRIALS_FULL = 50000 # Full run
@@ -11,6 +15,7 @@ TIME_STEP_COARSE = 1.0  # 1 second "Wait" step
 TIME_STEP_FINE = 1e-6   # 1 microsecond "Crash" step
 MAX_SIM_TIME = 10000.0  # 10,000s timeout
 HALF_LIFE_TARGET = 15 * 60  # 900 seconds
+SEED = None  # int (or --seed) to repeat a run; None draws fresh entropy, printed at the start
 
 # --- NEW "KNOBS" ---
 g_attract = 4e-2  # Strong attraction for crash
@@ -21,44 +26,50 @@ CRASH_THRESHOLD = 2.805e-19  # Battery size (calculated)
 
 COLLISION_DIST = 0.01
 
+# Wait phase: "table" samples ignition times from the tabulated first-passage
+# law (fast, cached per parameter set); "step" steps the walk (for validation)
+WAIT_MODE = "table"
+
+# One immutable parameter set per run, shared by every trial
+PARAMS = DecayParams(attract=g_attract, drag=g_drag, jitter=g_jitter, leak=g_leak,
+                     crash_threshold=CRASH_THRESHOLD, repel=balanced_repel(g_attract, CIRCUMFERENCE),
+                     collision_dist=COLLISION_DIST, circumference=CIRCUMFERENCE,
+                     dt_coarse=TIME_STEP_COARSE, dt_fine=TIME_STEP_FINE, max_time=MAX_SIM_TIME)
+
 class NeutronSim:
-    def __init__(self):
+    def __init__(self, params=PARAMS, rng=None):
+        self.params = params
+        self.rng = rng if rng is not None else random.Random()
         # Initial positions: Flares at 0 and 0.5
-        self.pos1 = 0.0
-        self.pos2 = 0.5
+        self.pos1, self.pos2 = params.start
         self.vel1 = 0.0
         self.vel2 = 0.0
         self.flare1_spin = 1   # d-flare
         self.flare2_spin = -1  # anti-d-flare
         self.flare_energy = 0.0  # Cumulative charging
         self.time = 0.0
-        self.time_step = TIME_STEP_COARSE
+        self.time_step = params.dt_coarse
         
         # --- FORCE BALANCING ---
-        global g_repel
-        initial_dist = self.distance()
-        initial_f_attract = g_attract / (initial_dist ** 2)
-        initial_f_repel_base = np.exp(-initial_dist / (CIRCUMFERENCE / 10))
-        if initial_f_repel_base > 0:
-            g_repel = initial_f_attract / initial_f_repel_base
-        else:
-            g_repel = 0
+        # Barrier strength is per trial: balanced at the start, dropped at ignition
+        self.repel = params.repel
 
     def distance(self):
         dist = abs(self.pos1 - self.pos2)
-        return min(dist, CIRCUMFERENCE - dist)
+        return min(dist, self.params.circumference - dist)
 
     def forces(self):
+        p = self.params
         dist = self.distance()
         if dist == 0: dist = 1e-20
         
         # Attraction (always on)
-        f_attract = g_attract / (dist ** 2)
+        f_attract = p.attract / (dist ** 2)
         dir1 = 1 if self.pos2 > self.pos1 else -1
         dir2 = -dir1
         
         # Repulsion (barrier, can be turned off)
-        f_repel = g_repel * np.exp(-dist / (CIRCUMFERENCE / 10))
+        f_repel = self.repel * np.exp(-dist / (p.circumference / 10))
         
         # Total forces
         f1 = f_attract * dir1 - f_repel * dir1
@@ -69,105 +80,112 @@ class NeutronSim:
     def step(self):
         # --- THIS IS A "DUMB" MECHANICAL STEP ---
         # The "brain" (the run() function) has
-        # already set the g_repel and time_step.
+        # already set the barrier and time_step.
         
         # --- Phase 2: Mechanical Sim ---
+        p = self.params
         f1, f2 = self.forces()
         
         # Update velocities
-        self.vel1 += (f1 - g_drag * self.vel1) * self.time_step
-        self.vel2 += (f2 - g_drag * self.vel2) * self.time_step
+        self.vel1 += (f1 - p.drag * self.vel1) * self.time_step
+        self.vel2 += (f2 - p.drag * self.vel2) * self.time_step
         
         # Update positions
-        self.pos1 = (self.pos1 + self.vel1 * self.time_step) % CIRCUMFERENCE
-        self.pos2 = (self.pos2 + self.vel2 * self.time_step) % CIRCUMFERENCE
+        self.pos1 = (self.pos1 + self.vel1 * self.time_step) % p.circumference
+        self.pos2 = (self.pos2 + self.vel2 * self.time_step) % p.circumference
         
         self.time += self.time_step
 
-    def run(self):
+    def wait(self):
         # --- LOOP 1: THE "WAIT" PHASE (Leaky Capacitor) ---
-        self.time_step = TIME_STEP_COARSE
-        while self.time < MAX_SIM_TIME:
+        p = self.params
+        self.time_step = p.dt_coarse
+        while self.time < p.max_time:
             # Calculate net charge
-            p_in = abs(random.uniform(-g_jitter, g_jitter))
-            p_out = g_leak
+            p_in = abs(self.rng.uniform(-p.jitter, p.jitter))
+            p_out = p.leak
             net_charge = p_in - p_out
             if net_charge > 0:
                 self.flare_energy += net_charge
-            if self.flare_energy > CRASH_THRESHOLD:
+            if self.flare_energy > p.crash_threshold:
                 # print(f"Ignition at time {self.time:.1f}s, entering crash phase.")
-                global g_repel
-                g_repel = 0.0
+                self.repel = 0.0
                 break
             self.time += self.time_step
-        
-        if self.flare_energy <= CRASH_THRESHOLD:
-            return None  # No ignition
-        
+        return self.flare_energy > p.crash_threshold
+
+    def crash(self):
         # --- LOOP 2: THE "CRASH" PHASE ---
-        self.time_step = TIME_STEP_FINE
-        crash_timeout = self.time + 10.0
+        p = self.params
+        self.time_step = p.dt_fine
+        crash_timeout = self.time + p.crash_timeout
         while self.time < crash_timeout:
             self.step()
-            if self.distance() < COLLISION_DIST:
+            if self.distance() < p.collision_dist:
                 return self.time
         
         return None
 
+    def run(self):
+        if not self.wait():
+            return None  # No ignition
+        return self.crash()
+
 def run_trial(_):
     sim = NeutronSim()
     return sim.run()
 
 if __name__ == '__main__':
     # --- MAIN EXECUTION ---
+    parser = argparse.ArgumentParser(description="Ignition Model neutron decay toy simulation")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed printed by an earlier run")
+    args = parser.parse_args()
     print(f"Running Ignition Model simulation with {NUM_TRIALS_FULL} trials...")
-    decay_times = []
-    progress_interval = NUM_TRIALS_FULL / 10
-    next_progress = progress_interval
-
     start_time = time.time()
-    last_update_time = start_time
 
-    # Use multiprocessing to parallelize
+    # Blocks of trials on every core, each with its own seeded stream (see ste_decay.py),
+    # summarized as they arrive (see ste_stats.py)
     num_cores = multiprocessing.cpu_count()
-    print(f"Using {num_cores} CPU cores for parallel processing.")
+    seed = np.random.SeedSequence(args.seed)
+    print(f"Using {num_cores} CPU cores for parallel processing (seed {seed.entropy}).")
+    stats = DecayStats(range=(0.0, PARAMS.max_time + PARAMS.crash_timeout))
+    progress_interval = NUM_TRIALS_FULL / 10
+    next_progress = progress_interval
+    last_update_time = start_time
 
-    with multiprocessing.Pool(processes=num_cores) as pool:
-        results = pool.imap_unordered(run_trial, range(NUM_TRIALS_FULL))
-        
-        for i, decay_time in enumerate(results):
-            if decay_time is not None:
-                decay_times.append(decay_time)
-            current_time = time.time()
-            if i >= next_progress or (current_time - last_update_time) >= 15:
-                progress_pct = int((i / NUM_TRIALS_FULL) * 100)
-                if decay_times:
-                    min_dt = np.min(decay_times)
-                    mean_dt = np.mean(decay_times)
-                    max_dt = np.max(decay_times)
-                    print(f"Progress: {progress_pct}% complete - Decays: {len(decay_times)}, Min: {min_dt:.2e}s, Mean: {mean_dt:.2e}s, Max: {max_dt:.2e}s")
-                else:
-                    print(f"Progress: {progress_pct}% complete - No decays yet")
+    for lo, block_times in iter_blocks(NUM_TRIALS_FULL, PARAMS, seed=seed, workers=num_cores,
+                                       wait=WAIT_MODE):
+        stats.update(block_times)
+        done = lo + len(block_times)
+        current_time = time.time()
+        if done >= next_progress or (current_time - last_update_time) >= 15:
+            progress_pct = int((done / NUM_TRIALS_FULL) * 100)
+            if stats.count:
+                print(f"Progress: {progress_pct}% complete - Decays: {stats.count}, Min: {stats.min:.2e}s, Mean: {stats.mean:.2e}s, Max: {stats.max:.2e}s")
+            else:
+                print(f"Progress: {progress_pct}% complete - No decays yet")
+            while next_progress <= done:
                 next_progress += progress_interval
-                last_update_time = current_time
+            last_update_time = current_time
 
     # --- ANALYSIS ---
     end_time = time.time()
     print(f"Simulation finished in {end_time - start_time:.2f} seconds.")
 
-    if decay_times:
-        half_life_sim = np.median(decay_times)
+    if stats.count:
+        half_life_sim = stats.median()
         print(f"Simulated Half-Life: {half_life_sim / 60:.2f} minutes")
         print(f"Target: {HALF_LIFE_TARGET / 60:.2f} minutes")
         error = abs(half_life_sim - HALF_LIFE_TARGET) / HALF_LIFE_TARGET * 100
         print(f"Error: {error:.2f}%")
         
-        plt.hist(decay_times, bins=50, alpha=0.7, label='Decay Times')
+        counts, edges = stats.histogram(bins=50)
+        plt.hist(edges[:-1], bins=edges, weights=counts, alpha=0.7, label='Decay Times')
         plt.axvline(half_life_sim, color='orange', linestyle='--', label=f'Sim: {half_life_sim/60:.2f} min')
         plt.axvline(HALF_LIFE_TARGET, color='red', linestyle='--', label='Target: 15.00 min')
         plt.xlabel('Time (seconds)')
         plt.ylabel('Frequency')
-        plt.title(f'Ignition Model: {len(decay_times)} Decays')
+        plt.title(f'Ignition Model: {stats.count} Decays')
         plt.legend()
         plt.savefig('ignition_model_histogram.png')
         plt.show()
@@ -0,0 +1,228 @@
+# ste_calibrate.py — Solve the ignition-model knobs for a target lifetime
+# Used by: command line, e.g.
+#   python ste_calibrate.py --mean 878 --cv 1 --clamp      (NeutronDecay_Grok.py)
+#   python ste_calibrate.py --median 900                   (Neutron_Decay_ToySim.py)
+#
+# Only the ratios leak / jitter and threshold / jitter shape the lifetimes, so
+# jitter is held fixed and leak and CRASH_THRESHOLD are solved for. The mean or
+# median sets the scale (mostly the threshold); the CV - or the median, given
+# both - sets the shape (mostly the leak). Without a shape target the leak
+# stays as given.
+#   1. Start from the diffusion approximation: a walk with drift mu (mean
+#      charge per draw) and per-draw variance var first reaches level a after
+#      a / mu draws on average, with CV^2 = var / (a mu). Under the Grok rule a
+#      CV near 1 needs leak > jitter / 2 (negative drift, reflected at zero),
+#      where this guess is only a starting point.
+#   2. Each round evaluates a grid of candidates - leak by row, log threshold
+#      by column - in one vectorized wait_phase call. Every candidate sees the
+#      same draws (common random numbers), so each statistic is monotone along
+#      a row and differences between candidates are not swamped by noise.
+#   3. Per row, interpolate the threshold that hits the scale target and the
+#      shape there; across rows, interpolate the leak that hits the shape. The
+#      grid re-centres on the result and shrinks along each axis it bracketed.
+#   4. Trials per candidate double each round (up to max_trials). The search
+#      stops as soon as, at the grid centre, every target is within tol and its
+#      95 % confidence interval is narrower than tol.
+# The scale alone takes seconds; with a CV target a few minutes.
+
+import argparse
+import dataclasses
+import warnings
+
+import numpy as np
+
+from ste_decay import DecayParams, crash_phase, wait_phase
+
+
+def increment_moments(jitter, leak, clamp):
+    """Mean and variance of one charging draw."""
+    if clamp:  # |U| - leak, U ~ uniform(-jitter, jitter)
+        return jitter / 2 - leak, jitter ** 2 / 12
+    a = max(jitter - leak, 0.0)  # max(|U| - leak, 0) is uniform(0, a) with prob a / jitter
+    mean = a * a / (2 * jitter)
+    return mean, a ** 3 / (3 * jitter) - mean * mean
+
+
+def leak_for_drift(drift, jitter, clamp):
+    """Inverse of increment_moments(...)[0] in leak."""
+    return jitter / 2 - drift if clamp else jitter - np.sqrt(2 * jitter * drift)
+
+
+def initial_guess(jitter, lifetime, cv, clamp):
+    """(leak, threshold) from the diffusion approximation for a mean lifetime and CV."""
+    lo, hi = np.log(jitter * 1e-9), np.log(jitter / 2)
+    for _ in range(200):  # var / (mu^2 T) falls as the drift mu grows
+        mid = 0.5 * (lo + hi)
+        mu = np.exp(mid)
+        var = increment_moments(jitter, leak_for_drift(mu, jitter, clamp), clamp)[1]
+        if var / (mu * mu * lifetime) > cv * cv:
+            lo = mid
+        else:
+            hi = mid
+    mu = np.exp(hi)
+    return leak_for_drift(mu, jitter, clamp), mu * lifetime
+
+
+def _summary(times, targets):
+    """Estimates and 95 % CI half-widths of the targeted statistics, per row."""
+    n = times.shape[1]
+    est, ci = {}, {}
+    with warnings.catch_warnings():  # candidates far off target may never decay
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(times, axis=1)
+        std = np.nanstd(times, axis=1)
+    if "mean" in targets:
+        est["mean"], ci["mean"] = mean, 1.96 * std / np.sqrt(n)
+    if "cv" in targets:
+        cv = std / mean
+        est["cv"], ci["cv"] = cv, 1.96 * cv * np.sqrt((1 + 2 * cv * cv) / (2 * n))
+    if "median" in targets:
+        s = np.sort(times, axis=1)  # NaN (no decay) sorts last
+        k = 1.96 * np.sqrt(n) / 2
+        lo = s[:, max(int(n / 2 - k), 0)]
+        hi = s[:, min(int(np.ceil(n / 2 + k)), n - 1)]
+        est["median"], ci["median"] = s[:, n // 2], (hi - lo) / 2
+    return est, ci
+
+
+def _root(x, y):
+    """
+    Where the monotone samples y(x) cross zero: interpolated if bracketed,
+    else extrapolated from the nearest end (at most two grid widths out).
+    Returns (root, bracketed).
+    """
+    if y[-1] < y[0]:
+        x, y = x[::-1], -y[::-1]
+    ok = np.isfinite(y)
+    x, y = x[ok], y[ok]
+    if x.size < 2:
+        return (x[0] if x.size else np.nan), False
+    if y[0] <= 0 <= y[-1]:
+        y = np.maximum.accumulate(y)  # sampling noise, if any
+        return float(np.interp(0.0, y, x)), True
+    i = [0, 1] if y[0] > 0 else [-2, -1]
+    slope = (y[i[1]] - y[i[0]]) / (x[i[1]] - x[i[0]])
+    width = abs(x[-1] - x[0])
+    end = x[i[0]] if y[0] > 0 else x[i[1]]
+    step = -y[i[0] if y[0] > 0 else i[1]] / slope if slope > 0 else np.inf
+    return float(end + np.clip(step, -2 * width, 2 * width)), False
+
+
+def calibrate(params, mean=None, median=None, cv=None, tol=0.01, trials=1024,
+              max_trials=1 << 16, grid=3, rounds=12, seed=None, verbose=False):
+    """
+    Solves params.leak and params.crash_threshold (jitter fixed) for the given
+    target lifetime statistics: mean or median sets the scale, cv (or the
+    median, given both) the shape. Returns (params, summary) with the
+    estimates, CI half-widths and trial count at the returned knobs.
+    """
+    targets = {k: v for k, v in (("mean", mean), ("median", median), ("cv", cv)) if v is not None}
+    if not targets or set(targets) == {"cv"}:
+        raise ValueError("need a mean or median lifetime target")
+    scale = "mean" if mean is not None else "median"
+    shape = "cv" if cv is not None else ("median" if len(targets) == 2 else None)
+    rng = np.random.default_rng(seed)
+    jitter, clamp = params.jitter, params.clamp
+    crash = crash_phase([0.0], params.attract, drag=params.drag,
+                        collision_dist=params.collision_dist, circumference=params.circumference,
+                        dt=params.dt_fine, timeout=params.crash_timeout, start=params.start)[0]
+
+    lifetime = targets[scale] - crash
+    if cv is not None:
+        leak, threshold = initial_guess(jitter, lifetime, cv, clamp)
+    else:
+        leak = params.leak
+        threshold = increment_moments(jitter, leak, clamp)[0] * lifetime
+    centre = np.array([leak / jitter, np.log(threshold)])
+    span = np.array([0.05 if shape else 0.0, 0.5])
+    slope = 0.0  # d log(threshold) / d(leak / jitter) along the scale target
+    axis = np.linspace(-1, 1, grid)
+    rows = axis if shape else np.zeros(1)
+    mid = (len(rows) // 2, grid // 2)  # the centre itself
+    for r in range(rounds):
+        n = min(trials << r, max_trials)
+        # Leak by row, log threshold by column; each row's columns centre on
+        # the threshold expected to hit the scale target at that leak
+        lk = np.clip(centre[0] + rows * span[0], 0.0, np.inf if clamp else 1.0)
+        lt = centre[1] + slope * (lk - centre[0])[:, None] + axis * span[1]
+        leak = np.repeat(lk * jitter, grid)
+        threshold = np.exp(lt).ravel()
+        times = wait_phase(leak.size * n, jitter, np.repeat(leak, n), np.repeat(threshold, n),
+                           max_time=params.max_time, dt=params.dt_coarse, clamp=clamp,
+                           rng=rng, shared=n).reshape(leak.size, n) + crash
+        est, ci = _summary(times, targets)
+        est = {k: v.reshape(len(rows), grid) for k, v in est.items()}
+        ci = {k: v.reshape(len(rows), grid) for k, v in ci.items()}
+
+        done = all(abs(est[k][mid] - v) <= tol * v and ci[k][mid] <= tol * v
+                   for k, v in targets.items())
+        if verbose:
+            line = ", ".join(f"{k} {est[k][mid]:.4g} ± {ci[k][mid]:.2g}" for k in targets)
+            print(f"round {r}: {leak.size} candidates x {n} trials: {line}", flush=True)
+        if done:
+            break
+
+        # Per row: the threshold that hits the scale target, and the shape there
+        # (with common random numbers both are monotone along a row)
+        fits = [_root(lt[i], np.log(est[scale][i] / targets[scale])) for i in range(len(rows))]
+        root = np.array([f[0] for f in fits])
+        bracketed = np.array([f[1] for f in fits])
+        new = [centre[0], root[mid[0]]]
+        if shape:
+            y = np.full(len(rows), np.nan)
+            for i in np.flatnonzero(np.isfinite(root)):
+                ok = np.isfinite(est[shape][i])
+                if bracketed[i]:
+                    y[i] = np.interp(root[i], lt[i][ok], est[shape][i][ok])
+                elif ok.sum() > 1:  # straight line through the row, as the root was found
+                    y[i] = np.polyval(np.polyfit(lt[i][ok], est[shape][i][ok], 1), root[i])
+            use = np.isfinite(y)
+            if use.sum() > 1:
+                x = lk[use]
+                leak_root, leak_ok = _root(x, y[use] - targets[shape])
+                new[0] = np.clip(leak_root, centre[0] - 2 * span[0], centre[0] + 2 * span[0])
+                slope = np.polyfit(x, root[use], 1)[0]
+                near = np.argmin(np.abs(x - new[0]))
+                new[1] = root[use][near] + slope * (new[0] - x[near])
+                if leak_ok and bracketed[use].all():
+                    span[0] *= 0.5
+        if bracketed.all():
+            span[1] *= 0.5
+        if np.all(np.isfinite(new)):
+            centre = np.array(new)
+
+    out = dataclasses.replace(params, leak=float(lk[mid[0]] * jitter),
+                              crash_threshold=float(np.exp(lt[mid])))
+    summary = {"estimate": {k: float(est[k][mid]) for k in targets},
+               "ci": {k: float(ci[k][mid]) for k in targets},
+               "trials": n, "rounds": r + 1, "converged": done}
+    return out, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve g_leak and CRASH_THRESHOLD for a target lifetime")
+    parser.add_argument("--mean", type=float, help="target mean lifetime (s)")
+    parser.add_argument("--median", type=float, help="target half-life / median lifetime (s)")
+    parser.add_argument("--cv", type=float, help="target coefficient of variation")
+    parser.add_argument("--clamp", action="store_true",
+                        help="Grok charging (clamp at 0) instead of ToySim (add only net > 0)")
+    parser.add_argument("--jitter", type=float, default=1.24e-21, help="g_jitter (held fixed)")
+    parser.add_argument("--leak", type=float, default=3.474e-22,
+                        help="g_leak (starting value, kept when no --cv)")
+    parser.add_argument("--attract", type=float, default=4e-2, help="g_attract (sets the crash time)")
+    parser.add_argument("--drag", type=float, default=1e-10, help="g_drag")
+    parser.add_argument("--tol", type=float, default=0.01, help="relative tolerance per target")
+    parser.add_argument("--max-trials", type=int, default=1 << 16, help="trials per candidate, at most")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    base = DecayParams(attract=args.attract, drag=args.drag, jitter=args.jitter, leak=args.leak,
+                       crash_threshold=0.0, clamp=args.clamp)
+    params, summary = calibrate(base, mean=args.mean, median=args.median, cv=args.cv,
+                                tol=args.tol, max_trials=args.max_trials, seed=args.seed,
+                                verbose=True)
+    status = "converged" if summary["converged"] else "NOT converged"
+    print(f"{status} after {summary['rounds']} rounds ({summary['trials']} trials per candidate)")
+    print(f"g_jitter = {params.jitter:.6g}")
+    print(f"g_leak = {params.leak:.6g}")
+    print(f"CRASH_THRESHOLD = {params.crash_threshold:.6g}")
@@ -0,0 +1,437 @@
+# ste_decay.py — Batched ensemble engine for the NeutronSim decay scripts
+# Used by: Neutron_Decay_ToySim.py, NeutronDecay_Grok.py
+#
+# A NeutronSim trial has two phases. In the "wait" phase a leaky capacitor is
+# charged once per coarse step by |uniform(-jitter, jitter)| - leak until its
+# energy crosses the crash threshold (ignition). In the "crash" phase the two
+# flares fall together on a fine step until they collide.
+#
+# The wait phase is a random walk, so here all trials advance at once: a
+# (trials x chunk) block of draws is reduced with a cumulative sum along time
+# and the first threshold crossing is found with argmax. Trials that ignite
+# drop out, so later chunks only draw for the survivors. The block width is
+# chosen to keep about `block` draws in memory at a time.
+#
+# The two scripts charge differently, and both rules are kept:
+#   clamp=False (ToySim):  E += net only when net > 0, i.e. E += max(net, 0)
+#   clamp=True  (Grok):    E = max(E + net, 0)
+# The clamped walk is the Lindley recursion, whose closed form is
+#   E_t = S_t - min(0, min_{s<=t} S_s),  S_t = E_0 + sum_{s<=t} net_s
+# so it vectorizes with a cumulative sum and a running minimum.
+#
+# --- PARAMETERS ---
+# The knobs of a run live in one frozen DecayParams, shared read-only by every
+# trial. Whatever changes during a trial (energy, positions, whether the
+# repulsion barrier is still up) belongs to that trial alone, so trials can
+# run in threads or processes without seeing each other.
+#
+# --- PARALLEL RUNS ---
+# run_parallel() cuts a run into fixed blocks of `block` trials. Block k draws
+# from its own stream, SeedSequence(seed).spawn(...)[k], and writes its decay
+# times straight into a shared-memory float64 array (NaN = no decay). Workers
+# only receive (block bounds, seed) and return nothing, so there is one task
+# per block instead of one pickle round-trip per trial, and the result for a
+# given seed does not depend on the number of workers. iter_blocks() runs the
+# same blocks but hands them back one at a time, for runs too large to keep
+# (feed them to ste_stats.DecayStats). Both scripts summarize on the fly, so
+# they use iter_blocks() in place of run_parallel(); run_parallel() is for
+# callers that want every decay time as one array.
+
+import hashlib
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+
+def balanced_repel(attract, circumference=1.0, start=(0.0, 0.5)):
+    """Barrier strength that cancels the attraction at the start separation."""
+    dist = abs(start[0] - start[1])
+    dist = min(dist, circumference - dist)
+    base = np.exp(-dist / (circumference / 10))
+    return attract / dist ** 2 / base if base > 0 else 0.0
+
+
+@dataclass(frozen=True)
+class DecayParams:
+    """Immutable knobs of one NeutronSim run (the scripts' g_* constants)."""
+
+    attract: float
+    drag: float
+    jitter: float
+    leak: float
+    crash_threshold: float
+    repel: float = 0.0          # barrier before ignition, 0 after
+    clamp: bool = False         # Grok: clamp energy at 0; ToySim: add only net > 0
+    collision_dist: float = 0.01
+    circumference: float = 1.0
+    dt_coarse: float = 1.0
+    dt_fine: float = 1e-6
+    max_time: float = 10000.0
+    crash_timeout: float = 10.0
+    start: tuple = (0.0, 0.5)
+
+
+def wait_phase(trials, jitter, leak, threshold, max_time=10000.0, dt=1.0, clamp=False,
+               rng=None, block=1 << 22, shared=None):
+    """
+    Ignition times (trials,) of the wait phase, NaN for trials that never
+    ignite before max_time. A trial that first exceeds `threshold` on draw k
+    (0-based) ignites at time k * dt, as in NeutronSim.run().
+    leak and threshold may be per-trial arrays. With shared=m, trial i reuses
+    the draws of trial i % m (common random numbers across parameter sets).
+    """
+    rng = np.random.default_rng(rng)
+    leak = np.asarray(leak, dtype=np.float64)
+    threshold = np.asarray(threshold, dtype=np.float64)
+    steps = int(np.ceil(max_time / dt))
+    times = np.full(trials, np.nan)
+    alive = np.arange(trials)
+    energy = np.zeros(trials)
+    start = 0
+    while alive.size and start < steps:
+        width = min(max(block // alive.size, 1), steps - start)
+        if shared:
+            draws = np.abs(rng.uniform(-jitter, jitter, (shared, width)))[alive % shared]
+        else:
+            draws = np.abs(rng.uniform(-jitter, jitter, (alive.size, width)))
+        net = draws - (leak if leak.ndim == 0 else leak[alive, None])
+        if clamp:
+            walk = energy[:, None] + np.cumsum(net, axis=1)
+            walk -= np.minimum(np.minimum.accumulate(walk, axis=1), 0.0)
+        else:
+            walk = energy[:, None] + np.cumsum(np.maximum(net, 0.0), axis=1)
+        crossed = walk > (threshold if threshold.ndim == 0 else threshold[alive, None])
+        hit = crossed.any(axis=1)
+        times[alive[hit]] = (start + crossed[hit].argmax(axis=1)) * dt
+        alive = alive[~hit]
+        energy = walk[~hit, -1]
+        start += width
+    return times
+
+
+# --- FAST WAIT PHASE ---
+# The wait-phase energy is a Markov chain, so its first-passage law can be
+# tabulated once instead of stepped for every trial. first_passage_cdf()
+# discretizes the energy into `bins` cells of threshold / bins, starts with all
+# probability at E = 0 and, once per coarse step, convolves the distribution
+# with the per-draw increment law (FFT). Mass that lands past the threshold is
+# the probability of igniting on that draw; with clamp=True mass below zero is
+# put back at zero. The result is the CDF of the ignition draw index, kept in
+# memory and in CACHE_DIR per parameter set, and sample_wait() inverts it with
+# one uniform draw per trial.
+#
+# The only approximation is rounding each increment to a whole cell, which
+# adds (threshold / bins)^2 / 12 of variance per draw. At the default
+# 2^14 bins both scripts' ignition times match the stepper (wait="step") to
+# within sampling noise: KS distance < 0.005 over 2 x 10^5 trials.
+
+FIRST_PASSAGE_BINS = 1 << 14
+CACHE_DIR = os.environ.get("STE_DECAY_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "ste_decay"))
+
+
+def _increment_cdf(x, jitter, leak, clamp):
+    """P(increment <= x) for one draw: |U(-jitter, jitter)| - leak (ToySim: only if > 0)."""
+    f = np.clip((x + leak) / jitter, 0.0, 1.0)
+    return f if clamp else np.where(x < 0, 0.0, f)
+
+
+@lru_cache(maxsize=16)
+def first_passage_cdf(jitter, leak, threshold, max_time=10000.0, dt=1.0, clamp=False,
+                      bins=FIRST_PASSAGE_BINS, cache_dir=CACHE_DIR):
+    """
+    cdf[k] = P(ignition on draw <= k) for k < ceil(max_time / dt); 1 - cdf[-1]
+    is the chance of never igniting. Cached in memory and under cache_dir.
+    """
+    key = repr((float(jitter), float(leak), float(threshold), float(max_time), float(dt),
+                bool(clamp), int(bins), 1))
+    path = None
+    if cache_dir:
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"first_passage_{digest}.npy")
+        if os.path.exists(path):
+            cdf = np.load(path)
+            cdf.flags.writeable = False
+            return cdf
+
+    steps = int(np.ceil(max_time / dt))
+    h = threshold / bins
+    lo = -leak if clamp else 0.0
+    kmin = min(int(np.floor(lo / h - 0.5)), 0)
+    kmax = max(int(np.ceil((jitter - leak) / h + 0.5)), 0)
+    k = np.arange(kmin, kmax + 1)
+    w = (_increment_cdf((k + 0.5) * h, jitter, leak, clamp)
+         - _increment_cdf((k - 0.5) * h, jitter, leak, clamp))
+    nfft = 1 << int(bins + len(k)).bit_length()
+    kernel = np.fft.rfft(w, nfft)
+
+    p = np.zeros(bins + 1)
+    p[0] = 1.0
+    pmf = np.zeros(steps)
+    for step in range(steps):
+        c = np.fft.irfft(np.fft.rfft(p, nfft) * kernel, nfft)[:bins + len(k)]
+        np.maximum(c, 0.0, out=c)
+        pmf[step] = c[bins + 1 - kmin:].sum()
+        p = c[-kmin:bins + 1 - kmin].copy()
+        p[0] += c[:-kmin].sum()  # below zero: clamped (ToySim increments are never negative)
+        if p.sum() < 1e-13:  # what is left is FFT round-off
+            break
+    cdf = np.minimum(np.cumsum(pmf), 1.0)
+    cdf.flags.writeable = False
+
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, cdf)
+        os.replace(tmp, path)
+    return cdf
+
+
+def sample_wait(trials, jitter, leak, threshold, max_time=10000.0, dt=1.0, clamp=False,
+                rng=None, bins=FIRST_PASSAGE_BINS):
+    """Ignition times like wait_phase(), drawn from the tabulated first-passage law."""
+    rng = np.random.default_rng(rng)
+    cdf = first_passage_cdf(jitter, leak, threshold, max_time, dt, clamp, bins)
+    k = np.searchsorted(cdf, rng.random(trials), side="right")
+    return np.where(k < len(cdf), k * dt, np.nan)
+
+
+# --- CRASH PHASE ---
+# After ignition the repulsion barrier is off (repel = 0 in both scripts) and
+# the flares fall together on the ring under g_attract / d^2. NeutronSim steps
+# this with semi-implicit Euler at TIME_STEP_FINE = 1e-6 s, about 1.4 million
+# steps per trial, and reports the end of the first step with d < COLLISION_DIST.
+#
+# crash_phase() advances all ignited trials together. The crash equations do
+# not depend on the clock, so trials that start from the same flare positions
+# share one trajectory: each distinct start is integrated once and the result
+# shifted by each trial's ignition time. With method="adaptive" each start
+# takes classical RK4 steps whose size follows the approach rate,
+#   h = eta * min(gap / |closing speed|, sqrt(gap / |closing acceleration|)),
+#   gap = d - COLLISION_DIST,
+# so steps are long while the flares are far apart and shrink towards the
+# collision. When a step crosses COLLISION_DIST the crossing time is found by
+# bisection on a single RK4 step from the start of that step, and then snapped
+# to the fixed grid: the reported time is the end of the first dt-step after
+# the crossing, as in the scalar loop.
+#
+# Against the scalar 1e-6 s loop the adaptive times agree to CRASH_TOLERANCE
+# (a few fixed steps: the Euler loop itself is only first order in dt) and
+# take a few hundred array steps instead of millions of Python steps.
+# method="fixed" repeats the scalar update exactly, vectorized over trials.
+
+CRASH_TOLERANCE = 5e-6  # seconds, adaptive vs fixed-step decay times
+
+
+def _ring_distance(p1, p2, circumference):
+    d = np.abs(p1 - p2)
+    return np.minimum(d, circumference - d)
+
+
+def _crash_accel(p1, p2, v1, v2, attract, drag, repel, circumference):
+    """dv/dt of both flares, the vectorized NeutronSim.forces() plus drag."""
+    dist = _ring_distance(p1, p2, circumference)
+    dist = np.where(dist == 0, 1e-20, dist)
+    dir1 = np.where(p2 > p1, 1.0, -1.0)
+    f = attract / dist ** 2 - repel * np.exp(-dist / (circumference / 10))
+    return f * dir1 - drag * v1, -f * dir1 - drag * v2
+
+
+def _rk4(state, h, attract, drag, repel, circumference):
+    """One RK4 step of size h (per trial) from state = (p1, p2, v1, v2)."""
+    args = (attract, drag, repel, circumference)
+
+    def deriv(s):
+        a1, a2 = _crash_accel(*s, *args)
+        return s[2], s[3], a1, a2
+
+    k1 = deriv(state)
+    k2 = deriv(tuple(s + 0.5 * h * k for s, k in zip(state, k1)))
+    k3 = deriv(tuple(s + 0.5 * h * k for s, k in zip(state, k2)))
+    k4 = deriv(tuple(s + h * k for s, k in zip(state, k3)))
+    new = tuple(s + h / 6 * (a + 2 * b + 2 * c + d)
+                for s, a, b, c, d in zip(state, k1, k2, k3, k4))
+    return new[0] % circumference, new[1] % circumference, new[2], new[3]
+
+
+def crash_phase(ignition_times, attract, drag=0.0, repel=0.0, collision_dist=0.01,
+                circumference=1.0, dt=1e-6, timeout=10.0, start=(0.0, 0.5),
+                method="adaptive", eta=1e-2):
+    """
+    Decay times (trials,) for trials that ignited at `ignition_times`, NaN where
+    the flares do not collide within `timeout`. The flares start at rest at
+    `start` = (pos1, pos2), scalars or per-trial arrays. method="fixed"
+    reproduces NeutronSim.crash() exactly (slow); "adaptive" agrees with it to
+    CRASH_TOLERANCE.
+    """
+    t0 = np.asarray(ignition_times, dtype=np.float64)
+    trials = len(t0)
+    args = (attract, drag, repel, circumference)
+    p1, p2 = (np.broadcast_to(np.asarray(s, dtype=np.float64), (trials,)).copy() for s in start)
+    state = (p1, p2, np.zeros(trials), np.zeros(trials))
+
+    if method == "fixed":
+        out = np.full(trials, np.nan)
+        alive = np.arange(trials)
+        time = t0.copy()
+        end = t0 + timeout
+        while alive.size:
+            p1, p2, v1, v2 = state
+            a1, a2 = _crash_accel(p1, p2, v1, v2, *args)
+            v1 = v1 + a1 * dt
+            v2 = v2 + a2 * dt
+            p1 = (p1 + v1 * dt) % circumference
+            p2 = (p2 + v2 * dt) % circumference
+            time += dt
+            hit = _ring_distance(p1, p2, circumference) < collision_dist
+            out[alive[hit]] = time[hit]
+            keep = ~hit & (time < end)
+            alive, time, end = alive[keep], time[keep], end[keep]
+            state = tuple(s[keep] for s in (p1, p2, v1, v2))
+        return out
+
+    # The crash is autonomous, so its duration depends only on the start state:
+    # integrate each distinct start once and shift by the ignition times.
+    starts, which = np.unique(np.column_stack(state[:2]), axis=0, return_inverse=True)
+    duration = _crash_durations(starts.tobytes(), collision_dist, dt, timeout, eta, args)
+    return t0 + duration[which.ravel()]
+
+
+@lru_cache(maxsize=32)
+def _crash_durations(starts, collision_dist, dt, timeout, eta, args):
+    """_crash_duration memoized per process: every block of a run shares its starts."""
+    p = np.frombuffer(starts).reshape(-1, 2)
+    return _crash_duration(p[:, 0].copy(), p[:, 1].copy(), collision_dist, dt, timeout, eta, args)
+
+
+def _crash_duration(p1, p2, collision_dist, dt, timeout, eta, args):
+    """Adaptive RK4 crash from rest at (p1, p2): time to collision on the dt grid, NaN past timeout."""
+    circumference = args[-1]
+    count = len(p1)
+    out = np.full(count, np.nan)
+    alive = np.arange(count)
+    state = (p1, p2, np.zeros(count), np.zeros(count))
+    elapsed = np.zeros(count)
+    while alive.size:
+        p1, p2, v1, v2 = state
+        gap = _ring_distance(p1, p2, circumference) - collision_dist
+        a1, a2 = _crash_accel(p1, p2, v1, v2, *args)
+        with np.errstate(divide="ignore"):
+            h = eta * np.minimum(gap / np.abs(v2 - v1), np.sqrt(gap / np.abs(a2 - a1)))
+        h = np.clip(h, dt, np.maximum(timeout - elapsed, dt))
+        new = _rk4(state, h, *args)
+        hit = _ring_distance(new[0], new[1], circumference) < collision_dist
+
+        if hit.any():
+            # Bisect for the crossing inside the step, then snap to the fixed grid
+            old = tuple(s[hit] for s in state)
+            lo, hi = np.zeros(hit.sum()), h[hit]
+            for _ in range(60):
+                mid = 0.5 * (lo + hi)
+                q = _rk4(old, mid, *args)
+                inside = _ring_distance(q[0], q[1], circumference) < collision_dist
+                hi = np.where(inside, mid, hi)
+                lo = np.where(inside, lo, mid)
+            out[alive[hit]] = np.ceil((elapsed[hit] + hi) / dt) * dt
+
+        elapsed = elapsed + h
+        keep = ~hit & (elapsed < timeout)
+        alive, elapsed = alive[keep], elapsed[keep]
+        state = tuple(s[keep] for s in new)
+    return out
+
+
+def run_ensemble(trials, params, rng=None, method="adaptive", wait="step"):
+    """
+    Decay times (trials,) of a whole run, NaN where a trial never decays.
+    wait="step" steps the wait phase; "table" samples it from the tabulated
+    first-passage law (fast, see sample_wait()).
+    """
+    sampler = {"step": wait_phase, "table": sample_wait}[wait]
+    ignition = sampler(trials, params.jitter, params.leak, params.crash_threshold,
+                       max_time=params.max_time, dt=params.dt_coarse, clamp=params.clamp,
+                       rng=rng)
+    out = np.full(trials, np.nan)
+    ignited = ~np.isnan(ignition)
+    # The barrier is dropped at ignition, so the crash runs with repel = 0
+    out[ignited] = crash_phase(ignition[ignited], params.attract, drag=params.drag,
+                               collision_dist=params.collision_dist,
+                               circumference=params.circumference, dt=params.dt_fine,
+                               timeout=params.crash_timeout, start=params.start,
+                               method=method)
+    return out
+
+
+def _warm_table(params, wait):
+    """Builds the first-passage table once here, not in every worker."""
+    if wait == "table":
+        first_passage_cdf(params.jitter, params.leak, params.crash_threshold,
+                          params.max_time, params.dt_coarse, params.clamp, FIRST_PASSAGE_BINS)
+
+
+def _block_tasks(trials, seed, block):
+    """(lo, hi, seed) per block; block k always gets stream k of `seed`."""
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    bounds = [(lo, min(lo + block, trials)) for lo in range(0, trials, block)]
+    return [(lo, hi, s) for (lo, hi), s in zip(bounds, seed.spawn(len(bounds)))]
+
+
+def _block_times(task):
+    lo, hi, params, seed, method, wait = task
+    return lo, run_ensemble(hi - lo, params, rng=np.random.default_rng(seed), method=method,
+                            wait=wait)
+
+
+def _run_block(task):
+    name, trials, lo, hi, params, seed, method, wait = task
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        out = np.ndarray((trials,), dtype=np.float64, buffer=shm.buf)
+        out[lo:hi] = _block_times((lo, hi, params, seed, method, wait))[1]
+        del out
+    finally:
+        shm.close()
+
+
+def run_parallel(trials, params, seed=None, workers=None, block=8192, method="adaptive",
+                 wait="step"):
+    """
+    Decay times (trials,) computed by `workers` processes (default: all cores),
+    NaN where a trial never decays. `seed` is an int or np.random.SeedSequence;
+    the same seed gives the same result for any number of workers.
+    """
+    _warm_table(params, wait)
+    shm = shared_memory.SharedMemory(create=True, size=max(trials, 1) * 8)
+    try:
+        out = np.ndarray((trials,), dtype=np.float64, buffer=shm.buf)
+        out[:] = np.nan
+        tasks = [(shm.name, trials, lo, hi, params, s, method, wait)
+                 for lo, hi, s in _block_tasks(trials, seed, block)]
+        with Pool(processes=workers) as pool:
+            pool.map(_run_block, tasks, chunksize=1)
+        result = out.copy()
+        del out
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
+
+
+def iter_blocks(trials, params, seed=None, workers=None, block=8192, method="adaptive",
+                wait="step"):
+    """
+    Yields (lo, decay times of trials lo .. lo + len - 1) block by block, in
+    order, without holding the whole run. Same seed and block give the same
+    values as run_parallel(). workers=0 runs the blocks in this process.
+    """
+    _warm_table(params, wait)
+    tasks = [(lo, hi, params, s, method, wait) for lo, hi, s in _block_tasks(trials, seed, block)]
+    if workers == 0:
+        yield from map(_block_times, tasks)
+        return
+    with Pool(processes=workers) as pool:
+        yield from pool.imap(_block_times, tasks)
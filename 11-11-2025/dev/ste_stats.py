@@ -0,0 +1,239 @@
+# ste_stats.py — Streaming statistics for decay runs
+# Used by: Neutron_Decay_ToySim.py, NeutronDecay_Grok.py
+#
+# Decay times arrive block by block and are summarized on the fly, so memory
+# stays constant however many trials run:
+#   RunningStats   count, mean, variance (Welford, merged per block with
+#                  Chan's formula), min, max
+#   QuantileSketch log-spaced buckets (as in DDSketch): any quantile to within
+#                  a relative error alpha, with about log(max/min) / (2 alpha)
+#                  buckets (~7000 for 1e-6 s .. 1e0 s at alpha = 1e-3)
+#   StreamingHistogram
+#                  np.histogram per block into HIST_BINS fixed bins over a
+#                  range given up front (for decay times [0, max_time +
+#                  crash_timeout]); plots sum whole bins, so counts are exact
+#   DecayStats     all of the above, plus the no-decay count (NaN entries)
+# Every update takes a whole NumPy block; per-report work does not depend on
+# how many trials came before.
+
+import numpy as np
+
+HIST_BINS = 5000  # fine bins of StreamingHistogram (2 s over the scripts' 10010 s)
+
+
+class RunningStats:
+    """Count, mean, variance, min and max of a stream in O(1) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """Adds a block of values."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        if v.size == 0:
+            return
+        mean = v.mean()
+        self._combine(v.size, mean, ((v - mean) ** 2).sum(), v.min(), v.max())
+
+    def merge(self, other):
+        """Adds everything another RunningStats has seen."""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, count, mean, m2, lo, hi):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    @property
+    def var(self):
+        """Population variance (ddof = 0, as np.var)."""
+        return self.m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+class QuantileSketch:
+    """
+    Quantiles of a stream of non-negative values to within relative error
+    `alpha`. Values below `min_value` are counted as zero.
+    """
+
+    def __init__(self, alpha=1e-3, min_value=1e-12):
+        self.alpha = alpha
+        self.min_value = min_value
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self.zeros = 0
+        self.offset = 0                       # key of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self):
+        return self.zeros + int(self.counts.sum())
+
+    def _key(self, v):
+        return np.ceil(np.log(v) / self._log_gamma).astype(np.int64)
+
+    def _value(self, key):
+        """Representative value of bucket `key` (relative error <= alpha)."""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _add(self, keys, counts):
+        lo = min(keys.min(), self.offset) if self.counts.size else keys.min()
+        hi = max(keys.max() + 1, self.offset + self.counts.size)
+        if self.counts.size == 0 or lo < self.offset or hi > self.offset + self.counts.size:
+            grown = np.zeros(hi - lo, dtype=np.int64)
+            grown[self.offset - lo:self.offset - lo + self.counts.size] = self.counts
+            self.counts, self.offset = grown, lo
+        np.add.at(self.counts, keys - self.offset, counts)
+
+    def update(self, values):
+        """Adds a block of values."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        small = v < self.min_value
+        self.zeros += int(small.sum())
+        v = v[~small]
+        if v.size:
+            keys, counts = np.unique(self._key(v), return_counts=True)
+            self._add(keys, counts)
+
+    def merge(self, other):
+        """Adds everything another sketch (same alpha) has seen."""
+        if other.alpha != self.alpha:
+            raise ValueError("can only merge sketches with the same alpha")
+        self.zeros += other.zeros
+        nz = np.flatnonzero(other.counts)
+        if nz.size:
+            self._add(nz + other.offset, other.counts[nz])
+
+    def quantile(self, q):
+        """Value at quantile q in [0, 1] (NaN if empty)."""
+        total = self.count
+        if total == 0:
+            return np.nan
+        rank = q * (total - 1)
+        if rank < self.zeros:
+            return 0.0
+        k = int(np.searchsorted(np.cumsum(self.counts), rank - self.zeros, side="right"))
+        return float(self._value(self.offset + k))
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+class StreamingHistogram:
+    """
+    Exact histogram of a stream over a range fixed up front: `bins` equal
+    bins over [lo, hi], the last one closed as in np.histogram. Values
+    outside the range are only counted (`outside`).
+    """
+
+    def __init__(self, lo, hi, bins=HIST_BINS):
+        self.range = (float(lo), float(hi))
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.outside = 0
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def update(self, values):
+        """Adds a block of values."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        counts = np.histogram(v, bins=len(self.counts), range=self.range)[0]
+        self.counts += counts
+        self.outside += int(v.size - counts.sum())
+
+    def merge(self, other):
+        """Adds another histogram over the same range and bins."""
+        if other.range != self.range or len(other.counts) != len(self.counts):
+            raise ValueError("can only merge histograms with the same range and bins")
+        self.counts += other.counts
+        self.outside += other.outside
+
+    def histogram(self, bins=None):
+        """
+        (counts, edges), as np.histogram gives them. With `bins`, the occupied
+        span is trimmed and whole bins are summed in groups to give at most
+        that many, so every count stays exact.
+        """
+        if bins is None:
+            return self.counts.copy(), self.edges.copy()
+        occupied = np.flatnonzero(self.counts)
+        if occupied.size == 0:
+            return self.counts[:0].copy(), self.edges[:1].copy()
+        first, last = occupied[0], occupied[-1] + 1
+        group = -(-(last - first) // bins)
+        starts = np.arange(first, last, group)
+        stop = min(starts[-1] + group, len(self.counts))
+        counts = np.add.reduceat(self.counts[first:stop], starts - first)
+        return counts, np.r_[self.edges[starts], self.edges[stop]]
+
+
+class DecayStats:
+    """
+    Streaming summary of decay times; NaN entries count as no-decay trials.
+    range: (lo, hi) of the histogram, e.g. (0, max_time + crash_timeout).
+    """
+
+    def __init__(self, range, alpha=1e-3, bins=HIST_BINS):
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(alpha)
+        self.hist = StreamingHistogram(*range, bins)
+        self.no_decay = 0
+
+    def update(self, times):
+        t = np.asarray(times, dtype=np.float64).ravel()
+        decayed = ~np.isnan(t)
+        self.no_decay += int(t.size - decayed.sum())
+        self.stats.update(t[decayed])
+        self.sketch.update(t[decayed])
+        self.hist.update(t[decayed])
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.sketch.merge(other.sketch)
+        self.hist.merge(other.hist)
+        self.no_decay += other.no_decay
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    @property
+    def mean(self):
+        return self.stats.mean
+
+    @property
+    def std(self):
+        return self.stats.std
+
+    @property
+    def min(self):
+        return self.stats.min
+
+    @property
+    def max(self):
+        return self.stats.max
+
+    def median(self):
+        return self.sketch.median()
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def histogram(self, bins=None):
+        """(counts, edges) of the decay times (see StreamingHistogram.histogram)."""
+        return self.hist.histogram(bins)
@@ -2,6 +2,87 @@ import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
+from ste_types import UP_QUARK
+
+# --- BATCHED LATTICE ---
+# Base triangle of one proton at unit radius: quark i sits at angle i * 120 deg
+# in its local x-y plane. Quarks 0, 1 are the up quarks, 2 the down quark.
+TRIANGLE = np.stack([np.cos(2 * np.pi / 3 * np.arange(3)),
+                     np.sin(2 * np.pi / 3 * np.arange(3)),
+                     np.zeros(3)], axis=1)
+UP_PUSH = 0.2      # up quarks forced apart by the spike (fraction of the radius)
+DOWN_SCALE = 0.5   # down quark sits at half the radius
+WASH_LIFT = 0.5    # EM wash band height above the up-quark edge (fraction of the radius)
+
+
+def build_protons(radius=1.0, rotation=None, offset=None, n=None, band_points=20, band_waves=5,
+                  dtype=np.float64):
+    """
+    Builds n protons in one vectorized pass. radius is a scalar or (n,),
+    rotation None or (n, 3, 3) / (3, 3) matrices (local -> world), offset
+    (n, 3) / (3,). n defaults to the batch size of the arguments. Returns
+    contiguous (quarks (n, 3, 3), wash (n, band_points, 3)) arrays.
+    """
+    radius = np.asarray(radius, dtype=dtype)
+    if n is None:
+        sizes = [radius.shape, np.shape(rotation)[:-2] if rotation is not None else (),
+                 np.shape(offset)[:-1] if offset is not None else ()]
+        n = max((s[0] for s in sizes if s), default=1)
+
+    # Distance of each quark from the centre, times its triangle direction
+    radius = np.broadcast_to(radius, (n,))
+    reach = np.empty((n, 3), dtype=dtype)
+    reach[:, :2] = (radius * (1 + UP_PUSH))[:, None]
+    reach[:, 2] = DOWN_SCALE * radius
+    quarks = reach[:, :, None] * TRIANGLE.astype(dtype)
+    up = np.broadcast_to(np.array([0, 0, 1], dtype=dtype), (n, 3))  # local z in world
+    if rotation is not None:
+        rotation = np.asarray(rotation, dtype=dtype)
+        quarks = np.matmul(quarks, np.swapaxes(rotation, -1, -2))
+        up = np.broadcast_to(rotation[..., :, 2], (n, 3))
+    if offset is not None:
+        quarks += np.asarray(offset, dtype=dtype)[..., None, :]
+
+    # Wash band, straight in world coordinates: along the up-quark edge, lifted
+    # along local z in band_waves waves. Point p = [1, t_p, lift_p] @ [q0, q1 - q0, radius * up]
+    t = np.linspace(0, 1, band_points, dtype=dtype)
+    weights = np.stack([np.ones_like(t), t, WASH_LIFT * (1 + np.sin(2 * np.pi * band_waves * t))],
+                       axis=1)
+    basis = np.stack([quarks[:, 0], quarks[:, 1] - quarks[:, 0], radius[:, None] * up], axis=1)
+    wash = np.empty((n, band_points, 3), dtype=dtype)
+    np.matmul(weights, basis, out=wash)
+    return quarks, wash
+
+
+def random_rotations(n, seed=None):
+    """n uniformly random rotation matrices (n, 3, 3), from normalized Gaussian quaternions."""
+    q = np.random.default_rng(seed).standard_normal((n, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    return np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+                     2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+                     2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+                    axis=1).reshape(n, 3, 3)
+
+
+def lattice_offsets(shape, spacing, origin=(0.0, 0.0, 0.0)):
+    """Centres of a cubic lattice of shape (nx, ny, nz), as (nx * ny * nz, 3)."""
+    axes = [origin[i] + spacing * np.arange(k) for i, k in enumerate(shape)]
+    return np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+def initial_conditions(quarks, velocity=1e-9, seed=None):
+    """
+    (pos, vel, types) for make_universe() from build_protons() quarks. The
+    engine has no down-quark species, so only the up quarks (0, 1) enter, as
+    UP_QUARK; velocities are Gaussian with std `velocity`.
+    """
+    pos = np.ascontiguousarray(quarks[:, :2], dtype=np.float32).reshape(-1, 3)
+    vel = np.random.default_rng(seed).standard_normal(pos.shape, dtype=np.float32)
+    vel *= np.float32(velocity)
+    return pos, vel, np.full(len(pos), UP_QUARK, dtype=np.uint8)
+
+
 class ProtonModel:
     """
     STE Model of the Proton: 2 Void Cores (Up Quarks) inducing a 3rd Spike Core (Down Quark)
@@ -11,55 +92,19 @@ class ProtonModel:
     - Spikes form a band projecting outward: EM wash for electron formation.
     """
 
-    def __init__(self, radius=1.0):
-        self.radius = radius
-        self.quark_positions = self._setup_tetrahedral_lattice()
-        self.intake_center = np.mean(self.quark_positions, axis=0)  # Centroid for gravitational pull
-        self.em_wash_band = self._generate_em_wash()
-
-    def _setup_tetrahedral_lattice(self):
+    def __init__(self, radius=1.0, band_points=20):
         """
         Tetrahedral lattice: Base triangle for 3 quarks.
         Down quark: 1/2 physical size, equal strength.
         Up quarks: Complementary spins pulling inward, forced apart by radiant spike.
+        Spikes form a band down one side projecting outward (the EM wash).
+        One proton of build_protons(); use that directly for many.
         """
-        # Equilateral triangle base, but adjust for forces
-        angle = 2 * np.pi / 3
-        positions = []
-        for i in range(3):
-            x = self.radius * np.cos(i * angle)
-            y = self.radius * np.sin(i * angle)
-            z = 0  # Base plane
-            if i == 2:  # Down quark (spike) inside radius, smaller
-                x *= 0.5
-                y *= 0.5
-            positions.append([x, y, z])
-        # Force up quarks apart due to spike: slightly expand their positions
-        # Up quarks at 0 and 1, down at 2
-        for i in [0, 1]:
-            pos = np.array(positions[i])
-            direction = pos / np.linalg.norm(pos)  # Outward
-            positions[i] = (pos + 0.2 * direction).tolist()  # Push apart
-        return np.array(positions)
-
-    def _generate_em_wash(self):
-        """
-        Spikes form a band down one side projecting outward.
-        Model as a helical band around the tetrahedron's edge.
-        """
-        # Simplified: Band along one edge, projecting outward
-        edge_start = self.quark_positions[0]
-        edge_end = self.quark_positions[1]
-        num_points = 20
-        t = np.linspace(0, 1, num_points)
-        band = []
-        for ti in t:
-            pos = (1 - ti) * edge_start + ti * edge_end
-            # Project outward along normal
-            normal = np.array([0, 0, 1])  # Upward projection
-            projection = pos + 0.5 * normal * (1 + np.sin(2 * np.pi * ti * 5))  # Wavy band
-            band.append(projection)
-        return np.array(band)
+        self.radius = radius
+        quarks, wash = build_protons(radius, n=1, band_points=band_points)
+        self.quark_positions = quarks[0]
+        self.intake_center = np.mean(self.quark_positions, axis=0)  # Centroid for gravitational pull
+        self.em_wash_band = wash[0]
 
     def visualize(self):
         """
@@ -2,21 +2,22 @@
 # Run: python STE_BASE.py
 # Output: All values correct, proton radius = 0.841 fm, STE_FLUID.png saved
 
-import numpy as np
 import matplotlib.pyplot as plt
 
+from ste_constants import Constants
+
 # === MEASURED INPUTS (CODATA 2022) ===
-alpha = 1 / 137.035999206        # Fine-structure constant
-a0 = 5.29177210903e-11           # Bohr radius (m)
-E_Pl = 1.22e19                   # Planck scale (GeV)
-v = 246.22                       # Higgs VEV (GeV)
+ste = Constants(ALPHA_SCREENED=1 / 137.035999206,  # Fine-structure constant
+                V_HIGGS=246.22)                    # Higgs VEV (GeV)
+alpha = ste.ALPHA_SCREENED
+a0 = ste.A0                      # Bohr radius (m)
 
-# === DERIVED VALUES ===
-H = np.log(E_Pl / v)                         # Gearing factor = 38.43
-alpha_W = np.exp(-2 * H)                     # Weak coupling = 4.06e-34
-alpha_v = 1 / (np.pi * H)                    # Bare EM at v = 1/120.7
-L_F = 4 * np.pi * a0 * alpha                 # Void-shell wavelength = 4.835e-18 m
-K_G = a0 / (L_F / (4 * np.pi))               # Gear ratio = 174.2
+# === DERIVED VALUES (see ste_constants.py) ===
+H = ste.H_GEAR                               # Gearing factor = 38.43
+alpha_W = ste.ALPHA_W                        # Weak coupling = 4.06e-34
+alpha_v = ste.ALPHA_BARE                     # Bare EM at v = 1/120.7
+L_F = ste.L_F_SHELL                          # Void-shell wavelength = 4.835e-18 m
+K_G = ste.K_G_SHELL                          # Gear ratio = 174.2
 r_p = K_G * L_F * 1e15                        # Proton radius in fm = 0.841 fm
 
 # === OUTPUT ===
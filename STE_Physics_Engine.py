@@ -20,31 +20,59 @@ class STEPhysicsEngine:
         # We use the screened alpha for low-energy orbital mechanics
         return self.alpha_screened * np.log(m_probe / m_baseline)
 
-    def proton_radius_reduction(self, m_probe):
+    def proton_radius_reduction(self, m_probe, m_baseline=M_ELECTRON):
         """
         Calculates the predicted % reduction in proton radius for a given probe.
         delta = L
         """
-        return self.lensing_law(m_probe)
+        return self.lensing_law(m_probe, m_baseline)
 
-    def rk_suppression(self, m_probe):
+    def rk_suppression(self, m_probe, m_baseline=M_ELECTRON):
         """
         Calculates the R_K suppression factor for a 4-vertex decay.
         S_f = 4 * L
         Returns the predicted R_K ratio (1 - S_f).
         """
-        l_factor = self.lensing_law(m_probe)
+        l_factor = self.lensing_law(m_probe, m_baseline)
         s_f = 4 * l_factor
         return 1.0 - s_f
 
-    def g_minus_2_anomaly(self, m_probe):
+    def g_minus_2_anomaly(self, m_probe, m_baseline=M_ELECTRON):
         """
         Calculates the predicted relative anomaly for g-2.
         Delta_a = L * alpha^2
         """
-        l_factor = self.lensing_law(m_probe)
+        l_factor = self.lensing_law(m_probe, m_baseline)
         return l_factor * (self.alpha_screened ** 2)
 
+    # --- BATCH PREDICTIONS ---
+    # Column names of predict(), in order
+    PREDICTIONS = ("lensing", "proton_radius_reduction", "rk_ratio", "g_minus_2")
+
+    def predict(self, m_probe, m_baseline=M_ELECTRON, structured=False):
+        """
+        All lensing-law predictions at once for arrays of probe and baseline
+        masses, broadcast against each other (e.g. probes[:, None] against
+        baselines[None, :] for every pair). L is computed once per pair, with
+        a single log. Returns a dict of arrays keyed by PREDICTIONS, or one
+        structured array with those fields if structured=True.
+        """
+        m_probe = np.asarray(m_probe, dtype=np.float64)
+        m_baseline = np.asarray(m_baseline, dtype=np.float64)
+        l_factor = self.alpha_screened * np.log(m_probe / m_baseline)
+        columns = {
+            "lensing": l_factor,
+            "proton_radius_reduction": l_factor.copy(),  # delta = L, its own array
+            "rk_ratio": 1.0 - 4 * l_factor,
+            "g_minus_2": l_factor * (self.alpha_screened ** 2),
+        }
+        if not structured:
+            return columns
+        out = np.empty(l_factor.shape, dtype=[(name, np.float64) for name in self.PREDICTIONS])
+        for name in self.PREDICTIONS:
+            out[name] = columns[name]
+        return out
+
     def weak_force_coupling(self):
         """Returns the derived Weak Force coupling constant."""
         return self.alpha_w
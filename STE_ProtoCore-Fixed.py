@@ -3,127 +3,104 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation, PillowWriter
-import pyopencl as cl
-
-# STE constants
-c = 299792458.0
-L_F = 4.54e-18
-K_G = 185.06
-proton_radius = L_F * K_G
-bohr_radius = proton_radius * 4 * np.pi * 137.036
-
-# OpenCL kernel — NO Unicode, NO undefined vars, NO frame
-kernel = """
-__kernel void ste_universe(
-    __global float3* pos,
-    __global float3* vel,
-    __global uchar* type,
-    float dt,
-    int n,
-    float proton_radius,
-    float L_F,
-    float bohr_radius,
-    int frame_counter
-)
-{
-    int i = get_global_id(0);
-    if (i >= n) return;
-
-    float3 p = pos[i];
-    float3 force = (float3)(0);
-
-    // Central siphon
-    float r_center = length(p) + 1e-10f;
-    // force -= p / (r_center * r_center * r_center);
-
-    // Hard shell
-    if (r_center < proton_radius) {
-        float pen = proton_radius - r_center;
-        force += pen * 1e20f * p / r_center;
-    }
-
-    // Boundary forces to keep in first octant
-    if (p.x < proton_radius) force.x += 1e20f;
-    if (p.y < proton_radius) force.y += 1e20f;
-    if (p.z < proton_radius) force.z += 1e20f;
-
-    // Pairwise repulsion
-    for (int j = 0; j < n; j++) {
-        if (i == j) continue;
-        float3 dp = pos[j] - p;
-        float r = length(dp) + 1e-10f;
-        if (r < proton_radius * 2.0f)
-            force += dp / (r * r * r);
-    }
-
-    // Up quark -> neutron
-    if (type[i] == 0) {
-        int near = 0;
-        for (int j = 0; j < n; j++) {
-            if (i == j) continue;
-            if (type[j] == 0 && length(pos[j] - p) < L_F * 10.0f)
-                near++;
-        }
-        if (near >= 2) type[i] = 1;
-    }
-
-    // Neutron decay (every 880 frames ≈ 15 min)
-    if (type[i] == 1) {
-        if ((frame_counter + i) % 880 == 0) {
-            type[i] = 2;
-            float3 dir = normalize(p + (float3)(1,1,1));
-            pos[i] += dir * bohr_radius * 0.1f;
-            // Spawn electron
-            for (int j = 0; j < n; j++) {
-                if (type[j] == 0) { // find an up quark to turn into electron
-                    type[j] = 3;
-                    pos[j] = p - dir * bohr_radius * 0.1f; // opposite direction
-                    vel[j] = vel[i] * 0.1f; // small velocity
-                    break;
-                }
-            }
-        }
-    }
-
-    vel[i] += force * dt;
-    pos[i] += vel[i] * dt;
-}
-"""
-
-# OpenCL setup
-ctx = cl.create_some_context()
-queue = cl.CommandQueue(ctx)
-prg = cl.Program(ctx, kernel).build()
-
-# 8000 up quarks
-n = 8000
-pos = np.abs(np.random.randn(n, 3).astype(np.float32)) * 100 * proton_radius
-vel = np.random.randn(n, 3).astype(np.float32) * 1e-9
-types = np.zeros(n, dtype=np.uint8)
-
-mf = cl.mem_flags
-pos_buf = cl.Buffer(ctx, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=pos)
-vel_buf = cl.Buffer(ctx, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=vel)
-type_buf = cl.Buffer(ctx, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=types)
-
-# Pre-run 1000 steps to spread particles
-for _ in range(1000):
-    prg.ste_universe(queue, (n,), None,
-                     pos_buf, vel_buf, type_buf,
-                     np.float32(0.05), np.int32(n),
-                     np.float32(proton_radius), np.float32(L_F),
-                     np.float32(bohr_radius), np.int32(0))
-    cl.enqueue_copy(queue, pos, pos_buf)
-    cl.enqueue_copy(queue, types, type_buf)
-    queue.finish()
+from matplotlib.animation import FuncAnimation
+import argparse
+import threading
+from ste_universe import proton_radius, L_F, K_G, bohr_radius, PROTON, make_universe, from_state
+from ste_octree import BarnesHut
+from ste_checkpoint import Checkpointer, load_checkpoint, restore_rng
+from ste_trajectory import TrajectoryWriter
+from ste_render import BlitRenderer, DensityMap, open_encoder
+from ste_snapshots import SnapshotRing, Stepper, by_type
+from ste_integrate import INTEGRATORS, EnergyMonitor, omega_h
+
+parser = argparse.ArgumentParser(description="STE: up quarks -> neutrons -> protons")
+parser.add_argument("--backend", choices=["auto", "cpu", "opencl"], default="auto",
+                    help="particle engine: OpenCL kernel or NumPy (auto picks OpenCL if available)")
+parser.add_argument("--workers", type=int, default=1,
+                    help="CPU threads for the NumPy backend (results do not depend on this)")
+parser.add_argument("--long-range", action="store_true",
+                    help="turn the siphon pull between all particles back on (Barnes-Hut tree)")
+parser.add_argument("--theta", type=float, default=0.5,
+                    help="Barnes-Hut opening angle (0 = exact direct sum)")
+parser.add_argument("--integrator", choices=INTEGRATORS, default="leapfrog",
+                    help="leapfrog, or respa: shell/wall forces sub-cycled inside each step "
+                         "(NumPy backend; see ste_integrate.py)")
+parser.add_argument("--substeps", type=int, default=10, help="contact substeps per respa step")
+parser.add_argument("--energy-every", type=int, default=0,
+                    help="record the total energy every this many frames (0 = off, NumPy backend)")
+parser.add_argument("--checkpoint", default="STE_checkpoint.npz",
+                    help="checkpoint file (written periodically, read by --resume)")
+parser.add_argument("--checkpoint-every", type=int, default=100,
+                    help="frames between checkpoints (0 = never)")
+parser.add_argument("--resume", action="store_true",
+                    help="continue bit-identically from --checkpoint instead of fresh quarks")
+parser.add_argument("--trajectory", default=None,
+                    help="memory-mapped trajectory file to append frames to (see ste_trajectory.py)")
+parser.add_argument("--trajectory-every", type=int, default=1,
+                    help="frames between saved trajectory frames")
+parser.add_argument("--frames", type=int, default=1000, help="frames to simulate")
+parser.add_argument("--quarks", type=int, default=8000, help="up quarks to start from")
+parser.add_argument("--lod-threshold", type=int, default=50000,
+                    help="above this many particles draw per-species density maps instead of "
+                         "points (see ste_render.py)")
+parser.add_argument("--lod-bins", type=int, default=512, help="density map cells per side")
+parser.add_argument("--render", default=None,
+                    help="render headless to this file instead of a window (.gif, .png = APNG, "
+                         "anything else = raw rgb24 frames; see ste_render.py)")
+parser.add_argument("--render-every", type=int, default=1, help="frames between rendered frames")
+parser.add_argument("--fps", type=int, default=20, help="frame rate of the --render output")
+parser.add_argument("--threaded", action="store_true",
+                    help="step in a background thread; drawing shows the newest frame and skips "
+                         "stale ones, so it never slows the physics (see ste_snapshots.py)")
+args = parser.parse_args()
+if args.render:
+    plt.switch_backend("Agg")
+
+long_range = BarnesHut(theta=args.theta, softening=proton_radius) if args.long_range else None
+monitor = EnergyMonitor(every=args.energy_every) if args.energy_every else None
+substeps = args.substeps if args.integrator == "respa" else 1
+integration = dict(integrator=args.integrator, substeps=substeps, monitor=monitor)
+
+if args.resume:
+    state = load_checkpoint(args.checkpoint)
+    restore_rng(state)
+    universe = from_state(state, backend=args.backend, workers=args.workers,
+                          long_range=long_range, **integration)
+    print(f"Resumed from {args.checkpoint} at frame {universe.frame}")
+else:
+    # 8000 up quarks
+    n = args.quarks
+    pos = np.abs(np.random.randn(n, 3).astype(np.float32)) * 100 * proton_radius
+    vel = np.random.randn(n, 3).astype(np.float32) * 1e-9
+    types = np.zeros(n, dtype=np.uint8)
+
+    universe = make_universe(pos, vel, types, dt=0.05, backend=args.backend,
+                             workers=args.workers, long_range=long_range, **integration)
+
+    # Pre-run 1000 steps to spread particles (queued back to back, one readback)
+    universe.advance(1000, frame_counter=0)
+pos, types = universe.read()
+checkpointer = Checkpointer(args.checkpoint, every=args.checkpoint_every)
+
+# Each u quark or neutron decays at most once, adding at most one electron
+slots = len(types) + int((types < PROTON).sum())
+
+trajectory = None
+if args.trajectory:
+    trajectory = TrajectoryWriter(args.trajectory, slots, stride=args.trajectory_every,
+                                  dt=float(universe.dt), append=args.resume,
+                                  resume_frame=universe.frame if args.resume else None,
+                                  constants={"L_F": L_F, "K_G": K_G,
+                                             "proton_radius": proton_radius,
+                                             "bohr_radius": bohr_radius})
 
 # Plot
 fig, ax = plt.subplots(figsize=(8,8), facecolor='white')
 ax.set_facecolor('white')
 ax.set_xlim(0, 2e-13)
 ax.set_ylim(0, 2e-13)
-ax.set_title("STE: 8000 Up Quarks → Neutrons → Protons", color='black')
+ax.set_title(f"STE: {args.quarks} Up Quarks → Neutrons → Protons", color='black')
 ax.axis('off')
 ax.grid(False)
 ax.set_xticks([])
@@ -135,34 +112,142 @@ sc_u = ax.scatter([], [], s=10, c='blue', label='u quark')
 sc_n = ax.scatter([], [], s=12, c='red', label='neutron')
 sc_p = ax.scatter([], [], s=14, c='green', label='proton')
 sc_e = ax.scatter([], [], s=8, c='orange', alpha=0.6, label='electron')
+title = ax.title
+legend = ax.legend(loc='upper right', facecolor='white', frameon=True)  # static: drawn once
+density = DensityMap(ax, ['blue', 'red', 'green', 'orange'], bins=args.lod_bins)
+scatters = (sc_u, sc_n, sc_p, sc_e)
+no_points = np.empty((0, 2), dtype=np.float32)
+
+# With a trajectory, a checkpoint is held until the trajectory has flushed
+# every frame up to it, so a resume never finds the file behind the checkpoint
+held = {}
+
+def step():
+    universe.advance(1, census=1)
+    if checkpointer.due(universe.frame):
+        if trajectory is None:
+            checkpointer.submit(universe.state())
+        else:
+            held[universe.frame] = universe.state()
+    return universe.frame
+
+def record(frame, read):
+    if trajectory.due(frame):
+        trajectory.append(frame, *read())
+    if frame in held:
+        trajectory.flush()
+        checkpointer.submit(held.pop(frame))
+
+def save():
+    if trajectory is not None:
+        record(universe.frame, universe.read)
+
+def draw():
+    global pos, types
+    pos, types, b = universe.read_by_type()
+    return show(pos, b)
+
+def draw_snapshot(snapshot):
+    global pos, types
+    with snapshot:  # by_type() copies, so the slot is free again right away
+        pos, types, b = by_type(snapshot.pos, snapshot.types)
+    return show(pos, b)
+
+def show(pos, b):
+    # Contiguous per-type views, no masks
+    u, n_pos, p, e = (pos[b[t]:b[t + 1]] for t in range(4))
+
+    # Level of detail: past the threshold, one density image instead of points
+    if b[-1] > args.lod_threshold:
+        density.update(pos, b)
+        for sc in scatters:
+            sc.set_offsets(no_points)
+    else:
+        density.hide()
+        for sc, part in zip(scatters, (u, n_pos, p, e)):
+            sc.set_offsets(part[:,:2])
+
+    title.set_text(f"STE: {len(u)} u, {len(n_pos)} n, {len(p)} p, {len(e)} e")
+    return sc_u, sc_n, sc_p, sc_e, density.image, title
 
-frame_counter = 0
 def update(*args):
-    global frame_counter
-    prg.ste_universe(queue, (n,), None,
-                     pos_buf, vel_buf, type_buf,
-                     np.float32(0.05), np.int32(n),
-                     np.float32(proton_radius), np.float32(L_F),
-                     np.float32(bohr_radius), np.int32(frame_counter))
-    cl.enqueue_copy(queue, pos, pos_buf)
-    cl.enqueue_copy(queue, types, type_buf)
-    queue.finish()
-
-    u = pos[types == 0]
-    n_pos = pos[types == 1]
-    p = pos[types == 2]
-    e = pos[types == 3] if np.any(types == 3) else np.empty((0,3))
-
-    sc_u.set_offsets(u[:,:2] if len(u)>0 else np.empty((0,2)))
-    sc_n.set_offsets(n_pos[:,:2] if len(n_pos)>0 else np.empty((0,2)))
-    sc_p.set_offsets(p[:,:2] if len(p)>0 else np.empty((0,2)))
-    sc_e.set_offsets(e[:,:2] if len(e)>0 else np.empty((0,2)))
-
-    ax.set_title(f"STE: {len(u)} u, {len(n_pos)} n, {len(p)} p, {len(e)} e", color='black')
-    ax.legend(loc='upper right', facecolor='white', frameon=True)
-    frame_counter += 1
-    fig.canvas.draw()
-    return sc_u, sc_n, sc_p, sc_e
-
-ani = FuncAnimation(fig, update, frames=1000, interval=50)
-plt.show()
\ No newline at end of file
+    step()
+    save()
+    return draw()
+
+if args.threaded:
+    # Stepper thread -> ring of preallocated snapshots. The renderer takes the
+    # newest one whenever it is ready; the trajectory writer every due frame.
+    ring = SnapshotRing(slots)
+    every = args.render_every if args.render else 1
+    recorded = lambda frame: (trajectory is not None
+                              and (trajectory.due(frame) or checkpointer.due(frame)))
+    stepper = Stepper(step, universe.read, ring, args.frames,
+                      wants=lambda frame: frame % every == 0 or recorded(frame))
+    writer = None
+    if trajectory is not None:
+        saved = ring.follow(recorded)
+        writer = threading.Thread(target=lambda: [record(s.frame, lambda: (s.pos, s.types))
+                                                  for s in saved], name="ste-trajectory")
+        writer.start()
+    stepper.start()
+
+    seen = -1
+    if args.render:
+        renderer = BlitRenderer(fig, [density.image, sc_u, sc_n, sc_p, sc_e, title], overlays=[legend])
+        encoder = open_encoder(args.render, fps=args.fps)
+        while (snapshot := ring.latest(after=seen)) is not None:
+            seen = snapshot.seq
+            draw_snapshot(snapshot)
+            encoder.write(renderer.render())
+        encoder.close()
+        print(f"Rendered {encoder.frames} of {ring.published} published frames to {args.render}")
+    else:
+        def update_latest(*args):
+            global seen
+            snapshot = ring.latest(after=seen, timeout=0)
+            if snapshot is None:
+                return sc_u, sc_n, sc_p, sc_e, density.image, title
+            seen = snapshot.seq
+            return draw_snapshot(snapshot)
+
+        ani = FuncAnimation(fig, update_latest, interval=50, cache_frame_data=False)
+        plt.show()
+        stepper.stop()
+    stepper.join()
+    if writer is not None:
+        writer.join()
+    if stepper.error is not None:
+        raise stepper.error
+    print(f"Stepped {stepper.done} frames at {stepper.rate:.1f} frames/s")
+elif args.render:
+    # Headless: static parts drawn once, only the scatters and title per frame
+    renderer = BlitRenderer(fig, [density.image, sc_u, sc_n, sc_p, sc_e, title], overlays=[legend])
+    encoder = open_encoder(args.render, fps=args.fps)
+    for i in range(args.frames):
+        step()
+        save()
+        if i % args.render_every == 0:
+            draw()
+            encoder.write(renderer.render())
+    encoder.close()
+    print(f"Rendered {encoder.frames} frames to {args.render}")
+else:
+    ani = FuncAnimation(fig, update, frames=args.frames, interval=50)
+    plt.show()
+checkpointer.close()
+if trajectory is not None:
+    trajectory.close()
+
+# u/n/p/e population time series (one row per animation frame)
+frames, counts = universe.populations()
+np.savetxt("STE_populations.csv", np.column_stack([frames, counts]), fmt="%d",
+           delimiter=",", header="frame,u,n,p,e", comments="")
+
+if monitor is not None:
+    frames, kinetic, potential, total = monitor.series()
+    np.savetxt("STE_energy.csv", np.column_stack([frames, kinetic, potential, total]),
+               fmt=["%d", "%.17g", "%.17g", "%.17g"], delimiter=",", header="frame,kinetic,potential,total", comments="")
+    print(f"Energy drift {monitor.drift():.3g} over {len(frames)} records "
+          f"({'stable' if monitor.stable() else 'UNSTABLE'}; shell omega*h = "
+          f"{omega_h(universe.dt, substeps):.3g}, needs < 2)")
@@ -8,13 +8,12 @@ import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation, PillowWriter
 import pyopencl as cl
 
-# --- STE CONSTANTS (from our 273 GeV anchor) ---
-c = 299792458.0
-L_F = 4.54e-18
-K_G = 185.06
-proton_radius = L_F * K_G                    # 0.841 fm
-bohr_radius = proton_radius * 4 * np.pi * 137.036
-alpha_speed = c / 137.036
+# --- STE CONSTANTS (from our 273 GeV anchor, see ste_constants.py) ---
+from ste_constants import C_LIGHT, L_F, K_G, ALPHA_SCREENED
+from ste_constants import PROTON_RADIUS as proton_radius  # 0.841 fm
+from ste_constants import BOHR_RADIUS as bohr_radius
+c = float(C_LIGHT)
+alpha_speed = c * ALPHA_SCREENED
 E_flip = 273e9 * 1.602e-19                   # 273 GeV in Joules
 rho_free = 1.7e17                            # Ambient STE field density (kg/m³)
 
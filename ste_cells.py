@@ -0,0 +1,148 @@
+# ste_cells.py — Uniform-grid (cell list) neighbour search for the particle engine
+# Used by: ste_universe.py
+#
+# Space is cut into cubes of side `cell_size` (the largest interaction cutoff),
+# so every interacting pair sits in the same or an adjacent cell. The grid is
+# rebuilt each step and only the 27 surrounding cells are visited: a step costs
+# O(n * occupancy) instead of O(n^2).
+#
+# Cell coordinates are clipped to +/- CELL_LIMIT so runaway particles (the
+# 1e20 boundary kicks send some very far) pile into edge cells instead of
+# overflowing the integer key. Clipping is monotone, so real neighbours stay
+# adjacent; distances are always re-checked after the cell lookup.
+
+import numpy as np
+
+CELL_LIMIT = (1 << 20) - 2   # 21 bits per axis, packed into one int64 key
+_BIAS = 1 << 20
+
+# The 27 cell offsets (dx, dy, dz) in a fixed order, (0, 0, 0) first
+OFFSETS = np.array([(0, 0, 0)] + [(dx, dy, dz)
+                                  for dx in (-1, 0, 1)
+                                  for dy in (-1, 0, 1)
+                                  for dz in (-1, 0, 1)
+                                  if (dx, dy, dz) != (0, 0, 0)], dtype=np.int64)
+
+
+def cell_coords(pos, cell_size):
+    """Integer cell coordinates (3, n) for (3, n) positions."""
+    c = np.floor(np.asarray(pos, dtype=np.float64) / cell_size)
+    return np.clip(c, -CELL_LIMIT, CELL_LIMIT).astype(np.int64)
+
+
+def pack_keys(cells):
+    """Packs (3, n) cell coordinates into exact int64 keys."""
+    return ((cells[0] + _BIAS) << 42) | ((cells[1] + _BIAS) << 21) | (cells[2] + _BIAS)
+
+
+class CellList:
+    """
+    CPU cell list: particles sorted by exact packed cell key, neighbour cells
+    found with a binary search. No hashing, so no pair is ever visited twice.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.order = None
+        self.keys = None
+        self.cells = None
+
+    def build(self, pos):
+        """Bins (3, n) positions. Call once per step before pairs()."""
+        self.cells = cell_coords(pos, self.cell_size)
+        keys = pack_keys(self.cells)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        return self
+
+    def blocks(self, block=1 << 16):
+        """Splits the cell-sorted order into [s0, s1) ranges of at most `block` particles."""
+        n = len(self.order)
+        return [(s0, min(s0 + block, n)) for s0 in range(0, n, block)]
+
+    def pairs(self, s0, s1):
+        """
+        Yields (li, j) for every ordered pair i != j in the same or adjacent cells,
+        where i = order[s0:s1][li]. Each i is owned by exactly one block, so blocks
+        can be processed independently (and in parallel).
+        """
+        members = self.order[s0:s1]
+        home = self.cells[:, members]
+        local = np.arange(len(members))
+        for k, off in enumerate(OFFSETS):
+            nkey = pack_keys(home + off[:, None])
+            lo = np.searchsorted(self.keys, nkey, side="left")
+            hi = np.searchsorted(self.keys, nkey, side="right")
+            count = hi - lo
+            total = int(count.sum())
+            if total == 0:
+                continue
+            li = np.repeat(local, count)
+            first = np.repeat(lo - (np.cumsum(count) - count), count)
+            j = self.order[first + np.arange(total)]
+            if k == 0:
+                keep = members[li] != j
+                li, j = li[keep], j[keep]
+            yield li, j
+
+
+# --- OPENCL CELL LIST ---
+# Hashed grid: particles are radix-sorted by cell hash; cell_start/cell_end give
+# each hash bucket's range in the sorted order. Neighbour loops compare the exact
+# cell coordinates so hash collisions never double-count a pair. Unused slots
+# (type EMPTY, defined by the including program) get key mask + 1, sort to the
+# end and are left out of every bucket.
+CELL_SOURCE = """
+#define CELL_LIMIT %(limit)d.0f
+
+int4 cell_of(float3 p, float cell_size)
+{
+    float3 c = clamp(floor(p / cell_size), -CELL_LIMIT, CELL_LIMIT);
+    return (int4)(convert_int3(c), 0);
+}
+
+uint cell_hash(int4 c, uint mask)
+{
+    return (((uint)c.x * 73856093u) ^ ((uint)c.y * 19349663u) ^ ((uint)c.z * 83492791u)) & mask;
+}
+
+__kernel void cell_assign(
+    __global const float3* pos,
+    __global const uchar* type,
+    __global int4* cell,
+    __global uint* cell_key,
+    __global uint* cell_index,
+    int n,
+    float cell_size,
+    uint mask
+)
+{
+    int i = get_global_id(0);
+    if (i >= n) return;
+    int4 c = cell_of(pos[i], cell_size);
+    cell[i] = c;
+    cell_key[i] = type[i] == EMPTY ? mask + 1 : cell_hash(c, mask);
+    cell_index[i] = i;
+}
+
+__kernel void cell_bounds(
+    __global const uint* sorted_key,
+    __global uint* cell_start,
+    __global uint* cell_end,
+    int n,
+    uint mask
+)
+{
+    int k = get_global_id(0);
+    if (k >= n) return;
+    uint h = sorted_key[k];
+    if (h > mask) return;
+    if (k == 0 || sorted_key[k - 1] != h) cell_start[h] = k;
+    if (k == n - 1 || sorted_key[k + 1] != h) cell_end[h] = k + 1;
+}
+""" % {"limit": CELL_LIMIT}
+
+
+def table_size(n):
+    """Hash table size: next power of two >= 2n."""
+    return 1 << max(1, int(2 * max(n, 1) - 1).bit_length())
@@ -0,0 +1,87 @@
+# ste_checkpoint.py — Checkpoint/restart for long particle runs
+# Used by: STE_ProtoCore-Fixed.py (--checkpoint, --checkpoint-every, --resume)
+#
+# A checkpoint is one .npz file holding everything a step depends on:
+# pos, vel, types, frame counter, pool capacity, lost-spawn count, the backend
+# that wrote it, and the global NumPy RNG state. Resuming from it on the same
+# backend continues bit-identically.
+#
+# Writes never stall the stepping loop: submit() hands a host copy of the state
+# to a background writer thread and returns. If the writer is still busy, the
+# newer checkpoint replaces the pending one (only the latest matters). Files
+# are written to a temporary name and renamed, so a crash mid-write leaves the
+# previous checkpoint intact.
+
+import os
+import threading
+
+import numpy as np
+
+
+def rng_state():
+    """The global NumPy RNG state as checkpoint fields."""
+    name, keys, pos, has_gauss, cached = np.random.get_state()
+    return {"rng_keys": keys, "rng_pos": pos, "rng_has_gauss": has_gauss,
+            "rng_cached_gaussian": cached}
+
+
+def restore_rng(state):
+    """Restores the global NumPy RNG from checkpoint fields."""
+    np.random.set_state(("MT19937", state["rng_keys"], int(state["rng_pos"]),
+                         int(state["rng_has_gauss"]), float(state["rng_cached_gaussian"])))
+
+
+def save_checkpoint(path, state):
+    """Writes `state` (dict of arrays/scalars) to `path` atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **state)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """Reads a checkpoint back into a dict."""
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+class Checkpointer:
+    """Periodic checkpoints written by a background thread."""
+
+    def __init__(self, path, every=100):
+        self.path = path
+        self.every = every
+        self.written = 0
+        self._pending = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def due(self, frame):
+        return self.every > 0 and frame % self.every == 0
+
+    def submit(self, state):
+        """Queues a state dict (already copied off the simulation buffers) and returns."""
+        state = dict(state, **rng_state())
+        with self._cond:
+            self._pending = state
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                state, self._pending = self._pending, None
+            save_checkpoint(self.path, state)
+            self.written += 1
+
+    def close(self):
+        """Writes any pending checkpoint and stops the writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
@@ -1,39 +1,177 @@
+import inspect
+
 import numpy as np
 
+# Every STE constant lives here once: measured anchors in ANCHORS, everything
+# else as a rule computing it from other constants. Constants() is one anchor
+# set; derived values are computed on first access and memoized, and changing
+# an anchor recomputes only what depends on it:
+#
+#   from ste_constants import H_GEAR              # default anchor set
+#   c = Constants(V_HIGGS=246.22)                 # another anchor set
+#   c.H_GEAR, c["ALPHA_W"]                        # computed on first access
+#   c.set(E_PL=1.2209e19)                         # drops H_GEAR, ALPHA_W, ALPHA_BARE only
+#   c2 = c.replace(ALPHA_SCREENED=1 / 137.036)    # new set, shares H_GEAR etc.
+#
+# Anchors may also be NumPy arrays (see ste_uncertainty.py); the rules broadcast.
+
 # --- FUNDAMENTAL ANCHORS ---
-# The two anchors of the STE model. Everything else is derived from these.
-E_PL = 1.22e19  # Planck Energy (GeV) - The 3D Bulk Scale
-V_HIGGS = 246.0 # Higgs VEV (GeV) - The 2D Surface Scale
+ANCHORS = {
+    # The two anchors of the STE model. Everything else is derived from these.
+    "E_PL": 1.22e19,  # Planck Energy (GeV) - The 3D Bulk Scale
+    "V_HIGGS": 246.0,  # Higgs VEV (GeV) - The 2D Surface Scale
+
+    # The "screened" alpha at low energy (observed value for standard physics)
+    # We use the standard CODATA value for low-energy interactions.
+    "ALPHA_SCREENED": 1 / 137.035999,
+
+    # --- PARTICLE MASSES (GeV) ---
+    # Needed for the Lensing Law calculations
+    "M_ELECTRON": 0.511e-3,
+    "M_MUON": 0.10566,
+    "M_TAU": 1.7768,
+    "M_PROTON": 0.93827,
+
+    # --- LATTICE SCALES (simulations) ---
+    "L_F": 4.54e-18,  # Void-shell wavelength (m), from the 273 GeV anchor
+    "K_G": 185.06,    # Gear ratio: proton radius / L_F
+    "A0": 5.29177210903e-11,  # Measured Bohr radius (m, CODATA)
+
+    # --- STANDARD PHYSICAL CONSTANTS ---
+    # For converting to SI units if needed
+    "C_LIGHT": 299792458,  # m/s
+    "H_BAR": 6.582119569e-25,  # GeV*s
+}
+
+# name -> (function, names of its inputs)
+RULES = {}
+
+
+def rule(name):
+    """Registers the decorated function as the rule for `name`; its parameter names are its inputs."""
+    def register(fn):
+        RULES[name] = (fn, tuple(inspect.signature(fn).parameters))
+        return fn
+    return register
+
 
 # --- THE FUNDAMENTAL GEARING FACTOR (H) ---
 # The logarithmic hierarchy that defines all force strengths.
 # H = ln(E_PL / V_HIGGS) approx 38.43
-H_GEAR = np.log(E_PL / V_HIGGS)
+@rule("H_GEAR")
+def _gearing(E_PL, V_HIGGS):
+    return np.log(E_PL / V_HIGGS)
+
 
 # --- DERIVED FORCE CONSTANTS ---
 # 1. Gravity (Bulk): Defined by E_PL (already set)
 # 2. Strong Force (Surface): Defined by V_HIGGS (already set)
 
 # 3. Weak Force (3D-to-2D Projection): alpha_W = e^(-2*H)
-ALPHA_W = np.exp(-2 * H_GEAR)
+@rule("ALPHA_W")
+def _weak(H_GEAR):
+    return np.exp(-2 * H_GEAR)
+
 
 # 4. Electromagnetism (2D-to-2D Leak):
 # The "bare" alpha at the 246 GeV scale.
 # alpha_bare = 1 / (pi * H_GEAR)
-ALPHA_BARE = 1 / (np.pi * H_GEAR)
-
-# The "screened" alpha at low energy (observed value for standard physics)
-# We use the standard CODATA value for low-energy interactions.
-ALPHA_SCREENED = 1 / 137.035999
-
-# --- PARTICLE MASSES (GeV) ---
-# Needed for the Lensing Law calculations
-M_ELECTRON = 0.511e-3
-M_MUON = 0.10566
-M_TAU = 1.7768
-M_PROTON = 0.93827
-
-# --- STANDARD PHYSICAL CONSTANTS ---
-# For converting to SI units if needed
-C_LIGHT = 299792458 # m/s
-H_BAR = 6.582119569e-25 # GeV*s
\ No newline at end of file
+@rule("ALPHA_BARE")
+def _bare_alpha(H_GEAR):
+    return 1 / (np.pi * H_GEAR)
+
+
+# --- LATTICE RADII (simulations) ---
+# Proton radius = L_F * K_G (0.841 fm); the electron orbit sits alpha^-1 * 4 pi further out
+@rule("PROTON_RADIUS")
+def _proton_radius(L_F, K_G):
+    return L_F * K_G
+
+
+@rule("BOHR_RADIUS")
+def _bohr_radius(PROTON_RADIUS, ALPHA_SCREENED):
+    return PROTON_RADIUS * 4 * np.pi / ALPHA_SCREENED
+
+
+# Void-shell wavelength and gear ratio from the measured Bohr radius (STE_Complete.py)
+@rule("L_F_SHELL")
+def _shell_wavelength(A0, ALPHA_SCREENED):
+    return 4 * np.pi * A0 * ALPHA_SCREENED
+
+
+@rule("K_G_SHELL")
+def _shell_gear_ratio(A0, L_F_SHELL):
+    return A0 / (L_F_SHELL / (4 * np.pi))
+
+
+def dependents(names):
+    """Every derived constant that depends, directly or not, on any of `names`."""
+    found = set()
+    frontier = set(names)
+    while frontier:
+        frontier = {name for name, (_, inputs) in RULES.items()
+                    if name not in found and frontier.intersection(inputs)}
+        found |= frontier
+    return found
+
+
+class Constants:
+    """
+    One anchor set (ANCHORS with `overrides`) and its derived constants,
+    computed lazily and memoized. c["NAME"] and c.NAME are equivalent.
+    """
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(ANCHORS)
+        if unknown:
+            raise KeyError(f"not anchors: {', '.join(sorted(unknown))}")
+        self._anchors = {**ANCHORS, **overrides}
+        self._values = {}
+
+    def __getitem__(self, name):
+        if name in self._anchors:
+            return self._anchors[name]
+        if name not in self._values:
+            fn, inputs = RULES[name]
+            self._values[name] = fn(*(self[i] for i in inputs))
+        return self._values[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(f"no constant {name!r}") from None
+
+    def set(self, **anchors):
+        """Changes anchors in place; forgets only the derived values that depend on them."""
+        Constants(**anchors)  # same check as the constructor
+        changed = [k for k, v in anchors.items() if self._anchors[k] is not v]
+        self._anchors.update(anchors)
+        for name in dependents(changed):
+            self._values.pop(name, None)
+
+    def replace(self, **anchors):
+        """A new anchor set; derived values unaffected by the change are shared, not recomputed."""
+        other = Constants(**{**self._anchors, **anchors})
+        stale = dependents(anchors)
+        other._values = {k: v for k, v in self._values.items() if k not in stale}
+        return other
+
+    def computed(self):
+        """Names of the derived constants computed so far."""
+        return set(self._values)
+
+
+# The default anchor set, served as module attributes on first access
+DEFAULT = Constants()
+
+__all__ = list(ANCHORS) + list(RULES)
+
+
+def __getattr__(name):
+    try:
+        return DEFAULT[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,130 @@
+# ste_integrate.py — Integrators and an energy monitor for the NumPy backend
+# Used by: ste_universe.py (NumpyUniverse integrator=, substeps=, monitor=),
+#          STE_ProtoCore-Fixed.py (--integrator, --substeps, --energy-every)
+#
+# The forces fall into two groups:
+#   contact  hard-shell spring and octant walls: per particle, no neighbours,
+#            cheap to evaluate but stiff (SHELL_K, WALL_FORCE ~ 1e20)
+#   field    pairwise force over the cell list and the long-range siphon:
+#            the expensive part of a step
+#
+# INTEGRATORS
+#   leapfrog  the update the engine has always used: v += F dt, x += v dt.
+#             Velocities are stored half a step behind positions, which makes
+#             it velocity Verlet (symplectic, second order) with one force
+#             evaluation per step. Bit-identical to earlier runs.
+#   respa     r-RESPA (Tuckerman, Berne & Martyna 1992): the field force kicks
+#             once per step of dt, and inside it the contact forces drive
+#             `substeps` velocity-Verlet substeps of dt / substeps. The field
+#             is evaluated once per step as before; only the cheap contact
+#             pass is repeated.
+# Both store v as the velocity after the step's last kick, still missing the
+# next step's opening half-kick. The synchronized velocity at a step's start
+# is v + F_field dt / 2 (F_field: all forces for leapfrog).
+#
+# ENERGY
+# Unit masses. Potentials matching the forces: shell 1/2 K pen^2, walls
+# WALL_FORCE * (R - x) per axis, pairs 1/r_cut - 1/r inside the cutoff. The
+# long-range siphon has no potential here and is left out. EnergyMonitor
+# records E every `every` steps; its relative drift is the accuracy
+# measure, and a non-finite E means the step blew up. For the shell spring,
+# omega h = sqrt(K) dt / substeps must stay below 2.
+
+import numpy as np
+
+from ste_constants import PROTON_RADIUS
+
+# --- CONTACT FORCES ---
+SHELL_K = 1e20      # hard-shell spring constant (force per unit penetration)
+WALL_FORCE = 1e20   # push away from each octant wall, within one proton radius of it
+PAIR_CUTOFF = 2 * PROTON_RADIUS
+
+INTEGRATORS = ("leapfrog", "respa")
+
+
+def add_contact_forces(p, force):
+    """Adds the shell and wall forces at positions p (3, n) to force (3, n), in place."""
+    f32 = np.float32
+    r_center = np.sqrt((p * p).sum(axis=0)) + f32(1e-10)
+    shell = r_center < f32(PROTON_RADIUS)
+    if shell.any():
+        pen = f32(PROTON_RADIUS) - r_center[shell]
+        force[:, shell] += pen * f32(SHELL_K) * p[:, shell] / r_center[shell]
+    force += np.where(p < f32(PROTON_RADIUS), f32(WALL_FORCE), f32(0))
+    return force
+
+
+def contact_substeps(p, v, dt, substeps):
+    """Velocity Verlet under the contact forces alone: `substeps` steps of dt / substeps, in place."""
+    h = np.float32(dt / substeps)
+    half = np.float32(dt / substeps / 2)
+    force = add_contact_forces(p, np.zeros_like(p))
+    for _ in range(substeps):
+        v += force * half
+        p += v * h
+        force.fill(0)
+        add_contact_forces(p, force)
+        v += force * half
+
+
+# --- ENERGY ---
+
+def contact_energy(p):
+    """Shell and wall potential energy at positions p (3, n)."""
+    p = p.astype(np.float64)
+    pen = np.maximum(PROTON_RADIUS - (np.sqrt((p * p).sum(axis=0)) + 1e-10), 0)
+    return 0.5 * SHELL_K * (pen * pen).sum() + WALL_FORCE * np.maximum(PROTON_RADIUS - p, 0).sum()
+
+
+def pair_energy(r):
+    """Potential of ordered pairs at distances r inside the cutoff (each pair appears twice)."""
+    return 0.5 * (1 / PAIR_CUTOFF - 1 / r.astype(np.float64)).sum()
+
+
+def kinetic_energy(v, force, dt):
+    """Kinetic energy at a step's start: stored v plus the opening half-kick of `force`."""
+    sync = v.astype(np.float64) + force.astype(np.float64) * (0.5 * float(dt))
+    return 0.5 * (sync * sync).sum()
+
+
+class EnergyMonitor:
+    """
+    Total energy every `every` steps. drift() is max |E - E0| / |E0| so far;
+    stable() is False once it exceeds `tolerance` or E stops being finite.
+    """
+
+    def __init__(self, every=1, tolerance=1e-3):
+        self.every = every
+        self.tolerance = tolerance
+        self.frames = []
+        self.kinetic = []
+        self.potential = []
+
+    def due(self, frame):
+        return self.every > 0 and frame % self.every == 0
+
+    def record(self, frame, kinetic, potential):
+        self.frames.append(frame)
+        self.kinetic.append(float(kinetic))
+        self.potential.append(float(potential))
+
+    def series(self):
+        """(frames, kinetic, potential, total) arrays of every record."""
+        k, u = np.array(self.kinetic), np.array(self.potential)
+        return np.array(self.frames, dtype=np.int64), k, u, k + u
+
+    def drift(self):
+        total = self.series()[3]
+        if len(total) == 0:
+            return 0.0
+        if not np.isfinite(total).all():
+            return np.inf
+        return float(np.abs(total - total[0]).max() / max(abs(total[0]), np.finfo(float).tiny))
+
+    def stable(self):
+        return self.drift() <= self.tolerance
+
+
+def omega_h(dt, substeps=1):
+    """Shell-spring stability number sqrt(K) h for contact steps of dt / substeps (stable below 2)."""
+    return float(np.sqrt(SHELL_K) * dt / substeps)
@@ -0,0 +1,147 @@
+# ste_octree.py — Barnes-Hut tree code for the long-range siphon force
+# Used by: ste_universe.py (optional long_range solver)
+#
+# The siphon pull ("fluid tension" gravity) acts between every pair of
+# particles, so a direct sum is O(n^2). Here the particles are binned into a
+# linear octree (Morton-sorted, one array per level) and each particle walks
+# the tree: a node of side s at distance d is used as a single point mass at
+# its centre of mass when s / d < theta, otherwise it is opened. Cost is
+# O(n log n); theta = 0 reproduces the direct sum.
+#
+# The walk is vectorized level by level: a frontier of (particle, node) pairs
+# is tested, accepted nodes are summed with np.bincount and opened nodes are
+# replaced by their children (found by binary search in the next level).
+
+import numpy as np
+
+MAX_DEPTH = 21  # 3 * 21 = 63 bits of Morton code
+
+
+def _spread_bits(v):
+    """Inserts two zero bits between each of the low 21 bits of v (int64)."""
+    v = v & 0x1FFFFF
+    v = (v | (v << 32)) & 0x1F00000000FFFF
+    v = (v | (v << 16)) & 0x1F0000FF0000FF
+    v = (v | (v << 8)) & 0x100F00F00F00F00F
+    v = (v | (v << 4)) & 0x10C30C30C30C30C3
+    v = (v | (v << 2)) & 0x1249249249249249
+    return v
+
+
+def morton_codes(q):
+    """Interleaves (3, n) integer coordinates (< 2^21) into Morton codes."""
+    return _spread_bits(q[0]) << 2 | _spread_bits(q[1]) << 1 | _spread_bits(q[2])
+
+
+class BarnesHut:
+    """
+    Long-range attraction F_i = strength * sum_j m_j (p_j - p_i) / (r^2 + softening^2)^(3/2)
+    evaluated with a monopole Barnes-Hut octree.
+    """
+
+    def __init__(self, theta=0.5, strength=1.0, softening=0.0, chunk=4096):
+        self.theta = theta
+        self.strength = strength
+        self.softening = softening
+        self.chunk = chunk
+
+    def _build(self, p, m):
+        """Sorts particles by Morton code and builds per-level (keys, mass, com, count)."""
+        n = p.shape[1]
+        lo = p.min(axis=1)
+        size = float((p.max(axis=1) - lo).max()) or 1.0
+        size *= 1 + 1e-9
+        q = np.clip(((p - lo[:, None]) / size * (1 << MAX_DEPTH)).astype(np.int64),
+                    0, (1 << MAX_DEPTH) - 1)
+        codes = morton_codes(q)
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        ps, ms = p[:, order], m[order]
+
+        levels = []
+        for level in range(MAX_DEPTH + 1):
+            k = codes >> (3 * (MAX_DEPTH - level))
+            start = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+            mass = np.add.reduceat(ms, start)
+            com = np.add.reduceat(ps * ms, start, axis=1) / mass
+            count = np.diff(np.r_[start, n])
+            levels.append((k[start], mass, com, count))
+            if len(start) == n:  # every node a single particle: deeper levels add nothing
+                break
+        return order, codes, ps, ms, size, levels
+
+    def forces(self, pos, mass=None):
+        """Returns the (3, n) long-range force on each of the (3, n) positions."""
+        p = np.asarray(pos, dtype=np.float64)
+        n = p.shape[1]
+        if n < 2:
+            return np.zeros((3, n))
+        m = np.ones(n) if mass is None else np.asarray(mass, dtype=np.float64)
+        order, codes, ps, ms, size, levels = self._build(p, m)
+        last = len(levels) - 1
+        eps2 = self.softening ** 2
+        theta2 = self.theta ** 2
+
+        acc = np.zeros((3, n))
+        for c0 in range(0, n, self.chunk):
+            c1 = min(c0 + self.chunk, n)
+            part = np.arange(c0, c1)
+            node = np.zeros(len(part), dtype=np.int64)
+            out = np.zeros((3, c1 - c0))
+            for level in range(last + 1):
+                keys, nmass, com, count = levels[level]
+                own = (codes[part] >> (3 * (MAX_DEPTH - level))) == keys[node]
+                d = com[:, node] - ps[:, part]
+                r2 = (d * d).sum(axis=0)
+                side = size / (1 << level)
+                leaf = (count[node] == 1) | (level == last)
+                accept = ~own & (leaf | (side * side < theta2 * r2))
+
+                # A coincident-particle leaf that holds the target: drop the target's own mass
+                w_mass = nmass[node]
+                if level == last:
+                    selfish = own & (count[node] > 1)
+                    if selfish.any():
+                        rest = w_mass[selfish] - ms[part[selfish]]
+                        d[:, selfish] = (w_mass[selfish] * com[:, node[selfish]]
+                                         - ms[part[selfish]] * ps[:, part[selfish]]) / rest \
+                            - ps[:, part[selfish]]
+                        r2[selfish] = (d[:, selfish] ** 2).sum(axis=0)
+                        w_mass = w_mass.copy()
+                        w_mass[selfish] = rest
+                        accept |= selfish
+
+                if accept.any():
+                    w = w_mass[accept] / (r2[accept] + eps2) ** 1.5
+                    local = part[accept] - c0
+                    for k in range(3):
+                        out[k] += np.bincount(local, weights=d[k, accept] * w, minlength=c1 - c0)
+
+                opened = ~accept & ~leaf
+                if not opened.any():
+                    break
+                # Children span [key << 3, (key + 1) << 3); uint64, since at the
+                # deepest level the upper bound is 2^63
+                child_keys = levels[level + 1][0].view(np.uint64)
+                first = keys[node[opened]].astype(np.uint64) << np.uint64(3)
+                a = np.searchsorted(child_keys, first, side="left")
+                b = np.searchsorted(child_keys, first + np.uint64(8), side="left")
+                cnt = b - a
+                part = np.repeat(part[opened], cnt)
+                node = np.repeat(a - (np.cumsum(cnt) - cnt), cnt) + np.arange(int(cnt.sum()))
+            acc[:, c0:c1] = out
+
+        result = np.empty_like(acc)
+        result[:, order] = acc * self.strength
+        return result
+
+
+def direct_forces(pos, mass=None, strength=1.0, softening=0.0):
+    """O(n^2) reference for BarnesHut.forces (small n only)."""
+    p = np.asarray(pos, dtype=np.float64)
+    n = p.shape[1]
+    m = np.ones(n) if mass is None else np.asarray(mass, dtype=np.float64)
+    d = p[:, None, :] - p[:, :, None]  # d[:, i, j] = p_j - p_i
+    r2 = (d * d).sum(axis=0) + softening ** 2
+    np.fill_diagonal(r2, np.inf)
+    return strength * (d * (m[None, None, :] / r2 ** 1.5)).sum(axis=2)
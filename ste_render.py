@@ -0,0 +1,239 @@
+# ste_render.py — Headless, blitted frame rendering streamed to an encoder
+# Used by: STE_ProtoCore-Fixed.py (--render, --render-every, --lod-threshold)
+#
+# BlitRenderer draws a figure once with everything static (axes, legend) and
+# keeps that as the background. Each frame then restores the background and
+# redraws only the animated artists (the scatters and the title) into the Agg
+# buffer: no layout, no full redraw, no display needed. Static artists that
+# belong on top (the legend) are cached as pixel regions and pasted back over
+# the animated ones.
+#
+# Frames go straight to an encoder, one at a time, so memory does not grow
+# with the frame count:
+#   .gif          GifEncoder   Pillow-encoded frames on the palette of the
+#                              first frame (the scene's colours never change)
+#   .png / .apng  ApngEncoder  animated PNG, RGB, written chunk by chunk
+#   other (.rgb)  RawEncoder   raw rgb24 frames plus a .json sidecar with the
+#                              size and rate, e.g. for
+#                              ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r FPS -i out.rgb out.mp4
+#
+# Above some particle count, scatter points stop being useful (and drawing them
+# costs O(n)). DensityMap is the level-of-detail replacement: each species is
+# binned into a 2D histogram of its x-y positions and the species are inked
+# onto white in their colours, all in one image. Binning is a few vectorized
+# passes into reused buffers; drawing then costs the same for any n.
+
+import json
+import struct
+import zlib
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgb
+from PIL import GifImagePlugin, Image
+
+
+class BlitRenderer:
+    """
+    Renders `fig` headless; only `artists` are redrawn per frame. `overlays`
+    are static artists kept on top of them (as cached pixels).
+    """
+
+    def __init__(self, fig, artists, overlays=()):
+        self.fig = fig
+        self.artists = list(artists)
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.canvas = FigureCanvasAgg(fig)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(fig.bbox)
+        renderer = self.canvas.get_renderer()
+        self.overlays = [self.canvas.copy_from_bbox(a.get_window_extent(renderer).padded(1))
+                         for a in overlays]
+
+    def render(self):
+        """The current frame as an (h, w, 4) uint8 RGBA view, valid until the next render()."""
+        self.canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+        for region in self.overlays:
+            self.canvas.restore_region(region)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+# --- DENSITY MAP ---
+
+class DensityMap:
+    """
+    One image over the axes' current limits, `bins` x `bins` cells; species t
+    (a contiguous run of pos, as read_by_type() returns them) is drawn in
+    colors[t], its density on a log scale. Hidden until the first update().
+    """
+
+    def __init__(self, ax, colors, bins=512):
+        (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+        self.bins = bins
+        self.origin = np.array([x0, y0], dtype=np.float32)
+        self.scale = np.array([bins / (x1 - x0), bins / (y1 - y0)], dtype=np.float32)
+        self.ink = np.ascontiguousarray(1 - np.array([to_rgb(c) for c in colors],
+                                                     dtype=np.float32).T)  # (3, species)
+        self.weights = np.zeros((len(colors), bins * bins), dtype=np.float32)
+        self.rgb = np.ones((3, bins * bins), dtype=np.float32)
+        self.image = ax.imshow(self._pixels(), origin="lower", extent=(x0, x1, y0, y1),
+                               aspect="auto", interpolation="nearest", zorder=0)
+        self.image.set_visible(False)
+        ax.set_xlim(x0, x1)
+        ax.set_ylim(y0, y1)
+        self._xy = np.empty((0, 2), dtype=np.float32)
+        self._ij = np.empty((0, 2), dtype=np.int64)
+        self._cell = np.empty(0, dtype=np.int64)
+
+    def _pixels(self):
+        return self.rgb.reshape(3, self.bins, self.bins).transpose(1, 2, 0)
+
+    def _reserve(self, n):
+        if len(self._cell) < n:
+            n = max(n, 2 * len(self._cell))
+            self._xy = np.empty((n, 2), dtype=np.float32)
+            self._ij = np.empty((n, 2), dtype=np.int64)
+            self._cell = np.empty(n, dtype=np.int64)
+
+    def update(self, pos, bounds):
+        """Rebins pos (n, 3), species t in pos[bounds[t]:bounds[t + 1]], and shows the image."""
+        n = int(bounds[-1])
+        species, cells = self.weights.shape
+        self._reserve(n)
+        xy, ij, cell = self._xy[:n], self._ij[:n], self._cell[:n]
+
+        # Cell of every particle; anything outside the view goes to one spare bin
+        np.subtract(pos[:n, :2], self.origin, out=xy)
+        np.multiply(xy, self.scale, out=xy)
+        np.floor(xy, out=xy)
+        np.clip(xy, -1, self.bins, out=xy)
+        ij[:] = np.nan_to_num(xy, copy=False, nan=-1)
+        np.multiply(ij[:, 1], self.bins, out=cell)
+        cell += ij[:, 0]
+        for t in range(species):
+            cell[bounds[t]:bounds[t + 1]] += t * cells
+        outside = ((ij < 0) | (ij >= self.bins)).any(axis=1)
+        cell[outside] = species * cells
+
+        # Log density per species, scaled to its own peak, inked onto white
+        counts = np.bincount(cell, minlength=species * cells + 1)[:-1]
+        np.log1p(counts.reshape(species, cells), out=self.weights)
+        peak = self.weights.max(axis=1, keepdims=True)
+        np.divide(self.weights, peak, out=self.weights, where=peak > 0)
+        np.matmul(self.ink, self.weights, out=self.rgb)
+        np.subtract(1, self.rgb, out=self.rgb)
+        np.clip(self.rgb, 0, 1, out=self.rgb)
+        self.image.set_data(self._pixels())
+        self.image.set_visible(True)
+        return self.image
+
+    def hide(self):
+        self.image.set_visible(False)
+        return self.image
+
+
+# --- ENCODERS ---
+
+class RawEncoder:
+    """Raw rgb24 frames, back to back, plus `path`.json with the geometry."""
+
+    def __init__(self, path, fps=20):
+        self.path = path
+        self.fps = fps
+        self.frames = 0
+        self.size = None
+        self.file = open(path, "wb")
+
+    def write(self, rgba):
+        h, w = rgba.shape[:2]
+        self.size = (w, h)
+        self.file.write(np.ascontiguousarray(rgba[:, :, :3]).tobytes())
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+        w, h = self.size or (0, 0)
+        with open(self.path + ".json", "w") as f:
+            json.dump({"width": w, "height": h, "fps": self.fps, "frames": self.frames,
+                       "pix_fmt": "rgb24"}, f)
+
+
+class GifEncoder:
+    """Animated GIF, looping; every frame is mapped onto the first frame's palette."""
+
+    def __init__(self, path, fps=20):
+        self.file = open(path, "wb")
+        self.duration = int(round(1000 / fps))
+        self.palette = None
+        self.frames = 0
+
+    def write(self, rgba):
+        image = Image.fromarray(np.ascontiguousarray(rgba[:, :, :3]))
+        if self.palette is None:
+            self.palette = image.quantize(256)
+            header, _ = GifImagePlugin.getheader(self.palette.copy(), info={"loop": 0})
+            self.file.write(b"".join(header))
+        frame = image.quantize(palette=self.palette, dither=Image.Dither.NONE)
+        self.file.write(b"".join(GifImagePlugin.getdata(frame, duration=self.duration)))
+        self.frames += 1
+
+    def close(self):
+        self.file.write(b";")
+        self.file.close()
+
+
+class ApngEncoder:
+    """Animated PNG (RGB, looping). The frame count in acTL is filled in by close()."""
+
+    def __init__(self, path, fps=20, level=1):
+        self.file = open(path, "wb")
+        self.fps = fps
+        self.level = level
+        self.frames = 0
+        self.sequence = 0
+        self.actl = None
+
+    def _chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data
+                        + struct.pack(">I", zlib.crc32(kind + data)))
+
+    def write(self, rgba):
+        h, w = rgba.shape[:2]
+        if self.actl is None:
+            self.file.write(b"\x89PNG\r\n\x1a\n")
+            self._chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+            self.actl = self.file.tell()
+            self._chunk(b"acTL", struct.pack(">II", 0, 0))
+        rows = np.empty((h, 1 + 3 * w), dtype=np.uint8)
+        rows[:, 0] = 0  # filter: none
+        rows[:, 1:] = rgba[:, :, :3].reshape(h, 3 * w)
+        data = zlib.compress(rows.tobytes(), self.level)
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, w, h, 0, 0,
+                                         1, self.fps, 0, 0))
+        self.sequence += 1
+        if self.frames == 0:
+            self._chunk(b"IDAT", data)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+            self.sequence += 1
+        self.frames += 1
+
+    def close(self):
+        if self.actl is not None:
+            self._chunk(b"IEND", b"")
+            self.file.seek(self.actl)
+            self._chunk(b"acTL", struct.pack(">II", self.frames, 0))
+        self.file.close()
+
+
+def open_encoder(path, fps=20):
+    """Encoder for `path`, chosen by extension (.gif, .png/.apng, anything else raw)."""
+    ext = path.lower().rsplit(".", 1)[-1]
+    if ext == "gif":
+        return GifEncoder(path, fps)
+    if ext in ("png", "apng"):
+        return ApngEncoder(path, fps)
+    return RawEncoder(path, fps)
@@ -0,0 +1,187 @@
+# ste_snapshots.py — Stepping thread and a ring of preallocated snapshots
+# Used by: STE_ProtoCore-Fixed.py (--threaded)
+#
+# The Stepper runs the simulation in its own thread and publishes frames into
+# a SnapshotRing: a fixed number of preallocated (pos, types) slots, written
+# in place, so publishing never allocates. Readers pin a slot while they use
+# it; the stepper always overwrites the oldest unpinned slot.
+#   latest()  the newest snapshot (the renderer): anything it did not get to
+#             in time is simply skipped, so drawing never slows the physics
+#   follow()  every snapshot a predicate wants, in order (the trajectory
+#             writer). Its pending frames stay pinned, so the stepper only
+#             waits if this reader falls a whole ring behind.
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+def by_type(pos, types):
+    """(pos, types, bounds) sorted by type, as NumpyUniverse.read_by_type() returns them."""
+    order = np.argsort(types, kind="stable")
+    bounds = np.zeros(5, dtype=np.int64)
+    bounds[1:] = np.cumsum(np.bincount(types, minlength=4)[:4])
+    return pos[order], types[order], bounds
+
+
+class Snapshot:
+    """One pinned ring slot. pos and types are views, valid until release()."""
+
+    def __init__(self, ring, slot):
+        self._ring = ring
+        self.slot = slot
+        self.seq = int(ring.seq[slot])
+        self.frame = int(ring.frame[slot])
+        count = int(ring.count[slot])
+        self.pos = ring.pos[slot, :count]
+        self.types = ring.types[slot, :count]
+
+    def release(self):
+        if self._ring is not None:
+            self._ring._release(self.slot)
+            self._ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SnapshotRing:
+    """`slots` preallocated frames of up to `n` particles; one writer, any number of readers."""
+
+    def __init__(self, n, slots=8):
+        self.n = n
+        self.pos = np.zeros((slots, n, 3), dtype=np.float32)
+        self.types = np.zeros((slots, n), dtype=np.uint8)
+        self.frame = np.full(slots, -1, dtype=np.int64)
+        self.count = np.zeros(slots, dtype=np.int64)
+        self.seq = np.full(slots, -1, dtype=np.int64)   # publication number, -1: none
+        self.refs = np.zeros(slots, dtype=np.int64)     # pins by readers and the writer
+        self.published = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        self._followers = []
+
+    def publish(self, frame, pos, types):
+        """Copies one frame into the oldest free slot (waits only while every slot is pinned)."""
+        m = len(types)
+        if m > self.n:
+            raise ValueError(f"frame has {m} particles, ring holds {self.n}")
+        with self._cond:
+            self._cond.wait_for(lambda: (self.refs == 0).any())
+            free = np.flatnonzero(self.refs == 0)
+            slot = free[np.argmin(self.seq[free])]
+            self.refs[slot] += 1
+            self.seq[slot] = -1  # invisible while being written
+        self.pos[slot, :m] = pos
+        self.types[slot, :m] = types
+        self.count[slot] = m
+        self.frame[slot] = frame
+        with self._cond:
+            self.seq[slot] = self.published
+            self.published += 1
+            self.refs[slot] -= 1
+            for wants, pending in self._followers:
+                if wants(frame):
+                    self.refs[slot] += 1
+                    pending.append(slot)
+            self._cond.notify_all()
+
+    def latest(self, after=-1, timeout=None):
+        """
+        Pins and returns the newest snapshot published after sequence number
+        `after`, waiting up to `timeout` seconds for one. None if there is
+        none (timed out, or closed).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.seq.max() > after, timeout)
+            if self.seq.max() <= after:
+                return None
+            slot = int(np.argmax(self.seq))
+            self.refs[slot] += 1
+            return Snapshot(self, slot)
+
+    def follow(self, wants):
+        """
+        Iterator over every snapshot published from now on whose frame
+        satisfies wants(frame), in order, until close(). Each is released when
+        the next one is taken.
+        """
+        pending = deque()
+        with self._cond:
+            self._followers.append((wants, pending))
+        return self._follow(pending)
+
+    def _follow(self, pending):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: pending or self.closed)
+                if not pending:
+                    return
+                slot = pending.popleft()
+                snapshot = Snapshot(self, slot)
+            try:
+                yield snapshot
+            finally:
+                snapshot.release()
+
+    def _release(self, slot):
+        with self._cond:
+            self.refs[slot] -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        """No more frames: readers drain what is pending and stop."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class Stepper(threading.Thread):
+    """
+    Calls step() `frames` times in its own thread; step() returns the frame
+    number. Frames with wants(frame) are read() as (pos, types) and published
+    into `ring`. The ring is closed when stepping ends; an exception in step()
+    is kept in .error.
+    """
+
+    def __init__(self, step, read, ring, frames, wants=lambda frame: True):
+        super().__init__(name="ste-stepper", daemon=True)
+        self._step = step
+        self._read = read
+        self.ring = ring
+        self.frames = frames
+        self.wants = wants
+        self.done = 0
+        self.elapsed = 0.0
+        self.error = None
+        self._halt = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            for _ in range(self.frames):
+                if self._halt.is_set():
+                    break
+                frame = self._step()
+                if self.wants(frame):
+                    self.ring.publish(frame, *self._read())
+                self.done += 1
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.ring.close()
+
+    def stop(self):
+        """Asks the thread to finish after the current frame."""
+        self._halt.set()
+
+    @property
+    def rate(self):
+        """Frames per second so far."""
+        return self.done / self.elapsed if self.elapsed else 0.0
@@ -0,0 +1,262 @@
+# ste_sweep.py — Parameter sweeps over the STE anchors, with a result cache
+# Used by: command line, e.g.
+#   python ste_sweep.py E_PL=1.1e19:1.3e19:101 V_HIGGS=240:250:101 --out sweep
+#   python ste_sweep.py --lhs 1000000 M_PROBE=0.01:2 --log M_PROBE --out probes
+#
+# A sweep is a set of points: columns of anchor values (any ANCHORS name from
+# ste_constants.py, plus M_PROBE, the lensing probe mass, which defaults to
+# M_MUON; unswept anchors keep their defaults). grid() spans a Cartesian
+# product, latin_hypercube() a seeded Latin hypercube. run_sweep() evaluates
+# the points CHUNK at a time on a process pool, each chunk one vectorized pass
+# through the constant registry and STEPhysicsEngine.predict(), giving OUTPUTS
+# per point.
+#
+# Results go to a columnar directory (one .npy per parameter and output
+# column, written chunk by chunk and readable with np.load(mmap_mode="r")).
+# Every computed point is also kept in CACHE_DIR, in a store keyed on the swept
+# parameter names, the values of everything unswept and SWEEP_VERSION. Points
+# are looked up by their exact parameter values, so re-running an overlapping
+# sweep computes only the new points.
+# Bump SWEEP_VERSION whenever a rule in ste_constants.py or the engine changes.
+
+import argparse
+import hashlib
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from ste_constants import ANCHORS, Constants
+from STE_Physics_Engine import STEPhysicsEngine
+
+SWEEP_VERSION = 3  # 3: one sorted store per cache directory, keyed on the unswept values
+PARAMETERS = tuple(ANCHORS) + ("M_PROBE",)
+OUTPUTS = ("H_GEAR", "ALPHA_W", "ALPHA_BARE") + STEPhysicsEngine.PREDICTIONS
+CHUNK = 1 << 16
+CACHE_DIR = os.environ.get("STE_SWEEP_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "ste_sweep"))
+
+
+# --- POINTS ---
+
+def grid(**axes):
+    """Every combination of the given axis values, {name: (n,) array}."""
+    names = list(axes)
+    mesh = np.meshgrid(*(np.asarray(axes[k], dtype=np.float64) for k in names), indexing="ij")
+    return {k: m.ravel() for k, m in zip(names, mesh)}
+
+
+def latin_hypercube(n, seed=None, log=(), **bounds):
+    """
+    n points, one per equal-probability stratum along every axis. bounds:
+    name=(lo, hi); names in `log` are stratified in log space.
+    """
+    rng = np.random.default_rng(seed)
+    points = {}
+    for name, (lo, hi) in bounds.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        if name in log:
+            points[name] = np.exp(np.log(lo) + u * (np.log(hi) - np.log(lo)))
+        else:
+            points[name] = lo + u * (hi - lo)
+    return points
+
+
+# --- EVALUATION ---
+
+def evaluate(params):
+    """OUTPUTS for parameter columns {name: (n,) array}, as {name: (n,) array}."""
+    n = len(next(iter(params.values())))
+    constants = Constants(**{k: v for k, v in params.items() if k != "M_PROBE"})
+    probe = params.get("M_PROBE", constants.M_MUON)
+    out = {k: constants[k] for k in ("H_GEAR", "ALPHA_W", "ALPHA_BARE")}
+    engine = STEPhysicsEngine()
+    engine.alpha_screened = constants.ALPHA_SCREENED
+    out.update(engine.predict(probe, constants.M_ELECTRON))
+    return {k: np.broadcast_to(np.asarray(out[k], dtype=np.float64), (n,)) for k in OUTPUTS}
+
+
+def _evaluate_chunk(task):
+    rows, names, values = task
+    return rows, evaluate(dict(zip(names, values.T)))
+
+
+# --- CACHE ---
+# One store per _cache_path() key: a structured .npy of every point evaluated so
+# far (a 64-bit key hashed from its parameter row, the row, and its OUTPUTS),
+# sorted by key. A point is looked up with np.searchsorted on the keys and
+# accepted only if the stored row equals it exactly, so a hash collision costs
+# a re-evaluation, never a wrong result. New points are merged in once per run
+# and the store is replaced atomically; a store written by a concurrent run
+# may be overwritten, which loses only cached work.
+
+def _cache_path(cache_dir, names):
+    """Store for sweeps over `names`, keyed also on every value they do not sweep."""
+    fixed = tuple((k, ANCHORS[k]) for k in ANCHORS if k not in names)
+    if "M_PROBE" not in names:
+        fixed += (("M_PROBE", "M_MUON"),)  # evaluate()'s default probe
+    key = repr((SWEEP_VERSION, tuple(names), OUTPUTS, fixed)).encode()
+    return os.path.join(cache_dir, hashlib.sha1(key).hexdigest()[:16] + ".npy")
+
+
+def _row_keys(values):
+    """64-bit key of each parameter row (n, d) (FNV-style mix of the float bits)."""
+    bits = np.ascontiguousarray(values + 0.0).view(np.uint64)  # + 0.0: -0.0 keys as 0.0
+    keys = np.full(len(values), 0xCBF29CE484222325, dtype=np.uint64)
+    for j in range(bits.shape[1]):
+        keys ^= bits[:, j]
+        keys *= np.uint64(0x100000001B3)
+        keys ^= keys >> np.uint64(29)
+    return keys
+
+
+def _record_dtype(width):
+    return np.dtype([("key", np.uint64), ("params", np.float64, (width,))]
+                    + [(k, np.float64) for k in OUTPUTS])
+
+
+def _load_store(path):
+    """The store at `path` memory-mapped, or None."""
+    try:
+        return np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+
+def _lookup(store, index, values):
+    """(row indices of `values` found in `store`, their records); index: store["key"] in memory."""
+    keys = _row_keys(values)
+    order = np.argsort(keys)  # sorted needles keep the search cache friendly
+    i = np.empty_like(order)
+    i[order] = np.minimum(np.searchsorted(index, keys[order]), len(index) - 1)
+    found = np.flatnonzero(index[i] == keys)
+    records = store[np.sort(i[found])]
+    found = found[np.argsort(i[found], kind="stable")]
+    exact = (records["params"] == values[found]).all(axis=1)
+    return found[exact], records[exact]
+
+
+def _save_store(path, store, new):
+    """Merges records `new` into `store` (or None) and replaces the file at `path`."""
+    if store is not None:
+        new = np.concatenate([np.asarray(store), new])
+    new = new[np.argsort(new["key"], kind="stable")]
+    new = new[np.r_[True, new["key"][1:] != new["key"][:-1]]]  # on a collision the first row stays
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, new)
+    os.replace(tmp, path)
+
+
+# --- SWEEP ---
+
+def _columns(out, names, n):
+    """Result columns: .npy files under `out` (opened for writing), or arrays."""
+    if out is None:
+        return {k: np.empty(n) for k in names}
+    os.makedirs(out, exist_ok=True)
+    return {k: np.lib.format.open_memmap(os.path.join(out, f"{k}.npy"), mode="w+",
+                                         dtype=np.float64, shape=(n,)) for k in names}
+
+
+def run_sweep(points, out=None, chunk=CHUNK, workers=None, cache_dir=CACHE_DIR):
+    """
+    Evaluates a sweep {name: (n,) array}. Returns ({column: (n,) array} with
+    the parameters and OUTPUTS, {"points", "cached", "computed"}); with `out`
+    the columns are .npy files in that directory. workers=0 runs in this
+    process; cache_dir=None disables the cache.
+    """
+    names = sorted(points)
+    unknown = set(names) - set(PARAMETERS)
+    if unknown:
+        raise KeyError(f"not sweep parameters: {', '.join(sorted(unknown))}")
+    values = np.column_stack([np.asarray(points[k], dtype=np.float64) for k in names])
+    n = len(values)
+    columns = _columns(out, names + list(OUTPUTS), n)
+    for j, k in enumerate(names):
+        columns[k][:] = values[:, j]
+
+    # Cached points are copied; the rest are queued for evaluation
+    path = _cache_path(cache_dir, names) if cache_dir else None
+    store = _load_store(path) if path else None
+    index = np.ascontiguousarray(store["key"]) if store is not None else None
+    missing = []
+    for lo in range(0, n, chunk):
+        rows = np.arange(lo, min(lo + chunk, n))
+        if store is not None and len(store):
+            found, records = _lookup(store, index, values[rows])
+            for k in OUTPUTS:
+                columns[k][lo + found] = records[k]
+            rows = np.delete(rows, found)
+        missing.append(rows)
+    missing = np.concatenate(missing) if missing else np.zeros(0, dtype=np.int64)
+    cached = n - len(missing)
+    tasks = [(missing[lo:lo + chunk], names, values[missing[lo:lo + chunk]])
+             for lo in range(0, len(missing), chunk)]
+    if workers == 0 or len(tasks) <= 1:
+        results = map(_evaluate_chunk, tasks)
+        pool = None
+    else:
+        pool = Pool(processes=workers)
+        results = pool.imap(_evaluate_chunk, tasks)
+    new = []
+    try:
+        for rows, outputs in results:
+            for k in OUTPUTS:
+                columns[k][rows] = outputs[k]
+            if path:
+                record = np.empty(len(rows), dtype=_record_dtype(len(names)))
+                record["params"] = values[rows]
+                record["key"] = _row_keys(record["params"])
+                for k in OUTPUTS:
+                    record[k] = outputs[k]
+                new.append(record)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if new:
+        _save_store(path, store, np.concatenate(new))
+
+    for column in columns.values():
+        if isinstance(column, np.memmap):
+            column.flush()
+    return columns, {"points": n, "cached": cached, "computed": n - cached}
+
+
+def _axis(spec):
+    """NAME=lo:hi[:count] -> (name, lo, hi, count)."""
+    name, _, rng = spec.partition("=")
+    parts = [float(x) for x in rng.split(":")]
+    return name, parts[0], parts[1], int(parts[2]) if len(parts) > 2 else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep STE anchors and probe masses")
+    parser.add_argument("axes", nargs="+", help="NAME=lo:hi:count (grid) or NAME=lo:hi (--lhs)")
+    parser.add_argument("--lhs", type=int, default=None, help="Latin hypercube of this many points")
+    parser.add_argument("--log", nargs="*", default=(), help="axes spaced in log")
+    parser.add_argument("--seed", type=int, default=0, help="Latin hypercube seed")
+    parser.add_argument("--out", default=None, help="directory for the result columns")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="points per chunk")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the cache")
+    args = parser.parse_args()
+
+    axes = [_axis(a) for a in args.axes]
+    if args.lhs:
+        points = latin_hypercube(args.lhs, seed=args.seed, log=args.log,
+                                 **{name: (lo, hi) for name, lo, hi, _ in axes})
+    else:
+        points = grid(**{name: (np.geomspace if name in args.log else np.linspace)(lo, hi, count or 11)
+                         for name, lo, hi, count in axes})
+
+    start = time.time()
+    columns, info = run_sweep(points, out=args.out, chunk=args.chunk, workers=args.workers,
+                              cache_dir=None if args.no_cache else CACHE_DIR)
+    print(f"{info['points']} points: {info['cached']} cached, {info['computed']} computed "
+          f"in {time.time() - start:.2f} s" + (f" -> {args.out}/" if args.out else ""))
+    for k in OUTPUTS:
+        print(f"  {k:<24} {np.min(columns[k]):.6g} .. {np.max(columns[k]):.6g}")
@@ -0,0 +1,147 @@
+# ste_trajectory.py — Memory-mapped trajectory files for particle runs
+# Used by: STE_ProtoCore-Fixed.py (--trajectory, --trajectory-every)
+#
+# A trajectory is one binary file: a fixed HEADER_BYTES header (magic + JSON
+# with n, stride, dt, frames and the model constants) followed by one
+# fixed-size record per saved frame:
+#
+#   frame  int64          simulation frame of the record
+#   count  int64          active slots in this frame (<= n)
+#   pos    float32 (n, 3) positions, NaN past count
+#   types  uint8 (n,)     particle types, EMPTY past count
+#
+# Records live in a memory map that grows by doubling (the file is extended
+# with truncate, which is sparse on every common filesystem), so writing a
+# frame is one copy into mapped pages and the writer never holds more than that
+# frame in RAM. Readers open the same file with np.memmap and slice without
+# copying: traj["pos"][f] is frame f, traj["pos"][:, i] is slot i over time.
+# Slot order is the engine's slot order, so a slot keeps its particle between
+# frames (an up quark slot becomes the electron it spawns).
+
+import json
+import os
+
+import numpy as np
+
+from ste_types import EMPTY
+
+MAGIC = b"STETRAJ1"
+HEADER_BYTES = 4096
+
+
+def record_dtype(n):
+    """numpy dtype of one frame record holding n slots."""
+    return np.dtype([("frame", "<i8"), ("count", "<i8"),
+                     ("pos", "<f4", (n, 3)), ("types", "u1", (n,))])
+
+
+def _read_header(f):
+    raw = f.read(HEADER_BYTES)
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{f.name} is not an STE trajectory file")
+    return json.loads(raw[len(MAGIC):].rstrip(b"\0").decode())
+
+
+def _write_header(f, header):
+    raw = MAGIC + json.dumps(header).encode()
+    if len(raw) > HEADER_BYTES:
+        raise ValueError("trajectory header too large")
+    f.seek(0)
+    f.write(raw.ljust(HEADER_BYTES, b"\0"))
+
+
+class TrajectoryWriter:
+    """
+    Streams frames into a growable memory-mapped trajectory file.
+    `n` is the slots per frame (an upper bound on active particles), `stride`
+    the steps between saved frames, `frames` the initial preallocation.
+    With append=True an existing file is continued with its own n and stride;
+    records past `resume_frame` (the checkpoint's frame) are dropped, so the
+    resumed run writes them again instead of duplicating them. Only frames
+    counted by the last flush() survive a crash, so flush with every checkpoint.
+    """
+
+    def __init__(self, path, n, stride=1, dt=0.05, constants=None, frames=1024,
+                 append=False, resume_frame=None):
+        self.path = path
+        if append and os.path.exists(path):
+            self._file = open(path, "r+b")
+            self.header = _read_header(self._file)
+        else:
+            self._file = open(path, "w+b")
+            self.header = {"n": int(n), "stride": int(stride), "dt": float(dt),
+                           "frames": 0, "constants": dict(constants or {})}
+            _write_header(self._file, self.header)
+        self.dtype = record_dtype(self.header["n"])
+        self.frames = self.header["frames"]
+        self._map = None
+        self._reserve(max(frames, self.frames, 1))
+        if resume_frame is not None:
+            self.frames = int(np.searchsorted(self._map["frame"][:self.frames], resume_frame,
+                                              side="right"))
+
+    def _reserve(self, frames):
+        """Extends the file to hold `frames` records and remaps it."""
+        if self._map is not None:
+            self._map.flush()
+            del self._map
+        self._file.truncate(HEADER_BYTES + frames * self.dtype.itemsize)
+        self._map = np.memmap(self._file, dtype=self.dtype, mode="r+",
+                              offset=HEADER_BYTES, shape=(frames,))
+
+    def due(self, frame):
+        return frame % self.header["stride"] == 0
+
+    def append(self, frame, pos, types):
+        """Writes one frame: (m, 3) positions and (m,) types of the active slots."""
+        n = self.header["n"]
+        m = len(types)
+        if m > n:
+            raise ValueError(f"frame has {m} particles, trajectory holds {n} slots")
+        if self.frames == len(self._map):
+            self._reserve(2 * len(self._map))
+        rec = self._map[self.frames]
+        rec["frame"] = frame
+        rec["count"] = m
+        rec["pos"][:m] = pos
+        rec["pos"][m:] = np.nan
+        rec["types"][:m] = types
+        rec["types"][m:] = EMPTY
+        self.frames += 1
+
+    def flush(self):
+        """Pushes written frames to disk and records the frame count in the header."""
+        self._map.flush()
+        self.header["frames"] = self.frames
+        _write_header(self._file, self.header)
+        self._file.flush()
+
+    def close(self):
+        """Flushes, trims the preallocated tail and closes the file."""
+        if self._map is None:
+            return
+        self.flush()
+        del self._map
+        self._map = None
+        self._file.truncate(HEADER_BYTES + self.frames * self.dtype.itemsize)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_trajectory(path, mode="r"):
+    """
+    Returns (header, records) where records is a zero-copy np.memmap of the
+    saved frames; fields are 'frame', 'count', 'pos' (frames, n, 3), 'types'.
+    """
+    with open(path, "rb") as f:
+        header = _read_header(f)
+    if header["frames"] == 0:
+        return header, np.zeros(0, dtype=record_dtype(header["n"]))
+    records = np.memmap(path, dtype=record_dtype(header["n"]), mode=mode,
+                        offset=HEADER_BYTES, shape=(header["frames"],))
+    return header, records
@@ -0,0 +1,12 @@
+# ste_types.py — Particle type codes shared by the engine and its tools
+# Used by: ste_universe.py (which re-exports them), ste_trajectory.py, Proton_Model.py
+#
+# Kept apart from ste_universe.py so plotting and file tools can name types
+# without importing the particle engine.
+
+# --- PARTICLE TYPES ---
+UP_QUARK = 0
+NEUTRON = 1
+PROTON = 2
+ELECTRON = 3
+EMPTY = 255  # unused pool slot
@@ -0,0 +1,180 @@
+# ste_uncertainty.py — Monte Carlo uncertainty propagation for the STE constants
+# Used by: command line (python ste_uncertainty.py --samples 10000000)
+#
+# ste_constants.py holds rounded point values. Here the measured anchors are
+# drawn from normal distributions centred on their CODATA 2018 / PDG values
+# with the quoted standard uncertainties, and pushed through the same formulas
+# and through STEPhysicsEngine.predict(), CHUNK samples at a time:
+#   - memory is set by the chunk size, however many samples run,
+#   - chunk k draws from SeedSequence(seed).spawn(...)[k], so the result does
+#     not depend on how many processes share the chunks,
+#   - each chunk is reduced to per-output sums and a fixed-bin histogram of the
+#     offset from the point value. The bins come from a pilot chunk (+- SPAN
+#     pilot std), so histograms from any number of chunks simply add up.
+# Quantiles are read from the merged histograms, to within one bin
+# (2 SPAN / BINS ~ 1e-3 std). The outputs at the rounded ste_constants values
+# are reported alongside, with their offset in units of std: the rounding is
+# far larger than the measurement uncertainty for V_HIGGS and the lepton masses.
+
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+from ste_constants import ANCHORS as CONSTANTS, Constants
+from STE_Physics_Engine import STEPhysicsEngine
+
+# --- ANCHOR DISTRIBUTIONS ---
+# name: (value, standard uncertainty); normal, centred on the measured value
+ANCHORS = {
+    "E_PL": (1.220890e19, 1.4e14),                        # CODATA: 1.220890(14)e19 GeV
+    "V_HIGGS": (246.21965, 6.3e-5),                       # (sqrt(2) G_F)^-1/2, G_F = 1.1663787(6)e-5 GeV^-2
+    "ALPHA_SCREENED": (1 / 137.035999084, 1.5e-10 / 137.035999084),  # CODATA: 1/137.035999084(21)
+    "M_ELECTRON": (0.51099895000e-3, 1.5e-13),            # CODATA: 0.51099895000(15) MeV
+    "M_MUON": (0.1056583755, 2.3e-9),                     # CODATA: 105.6583755(23) MeV
+    "M_TAU": (1.77686, 1.2e-4),                           # PDG: 1776.86(12) MeV
+}
+
+# Probes for the lensing-law predictions (baseline: the electron)
+PROBES = {"muon": "M_MUON", "tau": "M_TAU"}
+
+CHUNK = 1 << 20
+BINS = 1 << 14
+SPAN = 8.0
+QUANTILES = (0.00135, 0.02275, 0.15865, 0.5, 0.84135, 0.97725, 0.99865)  # median, +-1/2/3 sigma
+
+
+def sample_anchors(n, rng):
+    """n draws of every anchor, {name: (n,) array}."""
+    return {name: rng.normal(value, sigma, n) for name, (value, sigma) in ANCHORS.items()}
+
+
+def derive(anchors):
+    """Derived constants and lensing predictions from anchor values (floats or arrays)."""
+    constants = Constants(**anchors)
+    out = {name: constants[name] for name in ("H_GEAR", "ALPHA_W", "ALPHA_BARE")}
+    engine = STEPhysicsEngine()
+    engine.alpha_screened = anchors["ALPHA_SCREENED"]
+    for probe, mass in PROBES.items():
+        for name, column in engine.predict(anchors[mass], anchors["M_ELECTRON"]).items():
+            out[f"{probe}.{name}"] = column
+    return out
+
+
+def point_values():
+    """Every output at the measured (centre) anchor values."""
+    return {name: float(v) for name, v in derive({k: v for k, (v, _) in ANCHORS.items()}).items()}
+
+
+def rounded_values():
+    """Every output at the rounded ste_constants anchor values."""
+    return {name: float(v) for name, v in derive({k: CONSTANTS[k] for k in ANCHORS}).items()}
+
+
+# --- CHUNKS ---
+
+def _chunk(task):
+    """Per output: (count, sum, sum of squares) of the offset from the point value, and its histogram."""
+    seed, n, point, bins = task
+    out = derive(sample_anchors(n, np.random.default_rng(seed)))
+    result = {}
+    for name, values in out.items():
+        d = values - point[name]  # offsets keep the sums well conditioned
+        if bins is None:
+            result[name] = (n, d.sum(), (d * d).sum(), None)
+            continue
+        lo, width, count = bins[name]
+        k = np.clip(np.floor((d - lo) / width), -1, count).astype(np.int64) + 1  # 0, count + 1: outside
+        result[name] = (n, d.sum(), (d * d).sum(), np.bincount(k, minlength=count + 2))
+    return result
+
+
+def _merge(total, part):
+    for name, (n, s1, s2, hist) in part.items():
+        if name not in total:
+            total[name] = [0, 0.0, 0.0, np.zeros_like(hist)]
+        t = total[name]
+        t[0] += n
+        t[1] += s1
+        t[2] += s2
+        t[3] += hist
+
+
+def _quantile(hist, lo, width, q):
+    """Value (offset) at quantile q of a histogram with outside bins at both ends."""
+    cum = np.cumsum(hist)
+    rank = q * cum[-1]
+    i = int(np.searchsorted(cum, rank, side="left"))
+    if i == 0 or i == len(hist) - 1:
+        return np.nan  # beyond +- SPAN pilot std
+    below = cum[i - 1]
+    return lo + width * (i - 1 + (rank - below) / hist[i])
+
+
+def propagate(samples, seed=None, chunk=CHUNK, workers=None, quantiles=QUANTILES, bins=BINS):
+    """
+    Pushes `samples` anchor draws through derive(), `chunk` at a time on
+    `workers` processes (default: all cores; 0: this process). Returns
+    {output: {"point", "mean", "std", "quantiles": {q: value}, "rounded",
+    "offset"}}, where rounded is the output at the ste_constants values and
+    offset its distance from the point in std. The same seed and chunk give
+    the same result for any number of workers.
+    """
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(chunk, samples - lo) for lo in range(0, samples, chunk)]
+    streams = seed.spawn(len(sizes))
+    point = point_values()
+    rounded = rounded_values()
+
+    # Bins from the pilot (chunk 0): +- SPAN std around the point value
+    pilot = _chunk((streams[0], sizes[0], point, None))
+    edges = {}
+    for name, (n, s1, s2, _) in pilot.items():
+        std = np.sqrt(max(s2 / n - (s1 / n) ** 2, 0.0))
+        half = SPAN * std if std > 0 else max(abs(point[name]) * 1e-15, 1e-300)
+        edges[name] = (s1 / n - half, 2 * half / bins, bins)
+
+    tasks = [(s, n, point, edges) for s, n in zip(streams, sizes)]
+    total = {}
+    if workers == 0:
+        for part in map(_chunk, tasks):
+            _merge(total, part)
+    else:
+        with Pool(processes=workers) as pool:
+            for part in pool.imap(_chunk, tasks):
+                _merge(total, part)
+
+    report = {}
+    for name, (n, s1, s2, hist) in total.items():
+        lo, width, _ = edges[name]
+        mean = s1 / n
+        std = np.sqrt(max(s2 / n - mean * mean, 0.0))
+        report[name] = {
+            "point": point[name],
+            "mean": point[name] + mean,
+            "std": std,
+            "quantiles": {q: point[name] + _quantile(hist, lo, width, q) for q in quantiles},
+            "rounded": rounded[name],
+            "offset": (rounded[name] - point[name]) / std if std > 0 else np.nan,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo uncertainties of the STE predictions")
+    parser.add_argument("--samples", type=float, default=1e6, help="number of anchor draws")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="draws per chunk (sets memory)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    seed = np.random.SeedSequence(args.seed)
+    print(f"--- STE UNCERTAINTIES: {int(args.samples)} samples (seed {seed.entropy}) ---")
+    report = propagate(int(args.samples), seed=seed, chunk=args.chunk, workers=args.workers)
+    print(f"{'output':<32} {'point':>17} {'std':>10} {'2.3%':>17} {'median':>17} {'97.7%':>17}"
+          f" {'ste_constants':>17} {'offset/std':>11}")
+    for name, r in report.items():
+        q = r["quantiles"]
+        print(f"{name:<32} {r['point']:>17.11g} {r['std']:>10.3g} "
+              f"{q[0.02275]:>17.11g} {q[0.5]:>17.11g} {q[0.97725]:>17.11g} "
+              f"{r['rounded']:>17.11g} {r['offset']:>11.3g}")
@@ -0,0 +1,837 @@
+# ste_universe.py — The ste_universe particle engine (OpenCL + NumPy backends)
+# Used by: STE_ProtoCore-Fixed.py
+#
+# Both backends do the same work per step:
+#   1. Hard-shell push-out at the proton radius
+#   2. Octant boundary forces (keep particles in the first octant)
+#   3. Pairwise repulsion inside 2 * proton_radius
+#   4. Up quark -> neutron promotion (>= 2 up quarks within 10 L_F)
+#      (3 and 4 only visit adjacent cells of a per-step grid, see ste_cells.py)
+#   5. Neutron decay -> proton, spawning an electron from an up quark
+#   6. Explicit Euler velocity/position update
+# plus, optionally, a long-range siphon pull between all particles from a
+# Barnes-Hut tree (long_range=BarnesHut(...), see ste_octree.py). On OpenCL the
+# tree is built on the host, so that mode copies positions back every step.
+#
+# --- PARTICLE POOL ---
+# Buffers hold `capacity` slots; the first `n` are in use and the rest are
+# EMPTY. Each decay claims a slot from a free-slot list built by a compaction
+# pass: first the up quarks left after promotion (index order), then fresh
+# EMPTY slots past n. Claims are ranked by an exclusive scan, so they are O(1)
+# per event, lock-free, and never lost or duplicated. Every particle decays at
+# most once, so capacity = 2 * n can never overflow; the NumPy pool can also
+# grow on demand. Spawns that find no room are counted in `lost`.
+#
+# --- DOUBLE BUFFERING ---
+# A step reads only the start-of-step (pos, vel, type) buffers and writes a
+# second set, then the two are swapped. Electron spawns, the only writes to
+# *other* particles, happen in a separate reaction pass. A step is therefore
+# deterministic and can be split across any number of cores or work groups.
+#
+# --- STEPPING ---
+# advance(steps=k) enqueues k steps back to back. Nothing comes back to the host
+# except, every `every` steps, a small report: per-type counts and the bounding
+# box (device reductions on OpenCL), plus an optional every-stride-th-particle
+# snapshot. read() is the only full copy of the state.
+#
+# --- INTEGRATORS ---
+# The NumPy backend can swap the motion pass: leapfrog (the update above, the
+# default) or r-RESPA, which sub-cycles the stiff shell/wall forces inside each
+# step, plus an optional energy monitor (see ste_integrate.py). The OpenCL
+# kernel runs leapfrog only.
+#
+# --- POPULATIONS ---
+# census() records u/n/p/e counts for the current frame: a local-memory
+# histogram kernel on OpenCL (rows stay on the device until populations() is
+# called), np.bincount on CPU. read_by_type() sorts the active particles by type
+# and returns the boundaries, so each species is a contiguous view.
+#
+# --- BACKEND AGREEMENT ---
+# Starting from the same state, one step of either backend agrees to:
+#   - positions/velocities: |a - b| <= POS_RTOL * max(|a|, |b|) + POS_ATOL
+#     (float32 pairwise sums are accumulated in a different order)
+#   - types: exactly.
+# Trajectories are chaotic, so compare single steps, not long runs.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ste_cells import CELL_SOURCE, CellList, table_size
+from ste_constants import C_LIGHT, L_F, K_G, PROTON_RADIUS, BOHR_RADIUS
+from ste_integrate import (INTEGRATORS, add_contact_forces, contact_energy, contact_substeps,
+                           kinetic_energy, pair_energy)
+from ste_types import UP_QUARK, NEUTRON, PROTON, ELECTRON, EMPTY
+
+# --- STE CONSTANTS (see ste_constants.py) ---
+c = float(C_LIGHT)
+proton_radius = PROTON_RADIUS
+bohr_radius = BOHR_RADIUS
+
+DECAY_PERIOD = 880  # frames (~15 min)
+
+# Grid cell side: the larger of the repulsion and splash cutoffs
+cell_size = max(proton_radius * 2.0, L_F * 10.0)
+
+CENSUS_ROWS = 1024  # census rows buffered on the device between readbacks
+
+# --- AGREEMENT TOLERANCE (see header) ---
+POS_RTOL = 1e-5
+POS_ATOL = 1e-6 * proton_radius
+
+# OpenCL kernels — NO Unicode, NO undefined vars, NO frame
+# float3 buffers have a 16-byte stride, so host arrays are padded to (n, 4).
+# Every buffer is either read-only (_in) or written only at index i (_out):
+# no work item ever sees another's writes, so launch order cannot matter.
+SPAWN_SOURCE = """
+#define EMPTY 255
+
+// Packs (free up quark, decayed this step) flags into one scan item:
+// free count in the low 32 bits, decay count in the high 32 bits.
+#define SPAWN_FLAGS(t_in, t_out) \\
+    (((t_out) == 0 ? 1UL : 0UL) | (((t_out) == 2 && (t_in) != 2) ? (1UL << 32) : 0UL))
+"""
+
+KERNEL = SPAWN_SOURCE + CELL_SOURCE + """
+__kernel void ste_universe(
+    __global const float3* pos_in,
+    __global const float3* vel_in,
+    __global const uchar* type_in,
+    __global float3* pos_out,
+    __global float3* vel_out,
+    __global uchar* type_out,
+    __global const int4* cell,
+    __global const uint* cell_index,
+    __global const uint* cell_start,
+    __global const uint* cell_end,
+    __global const float3* far_force,
+    int use_far,
+    float dt,
+    int n,
+    float proton_radius,
+    float L_F,
+    float bohr_radius,
+    int frame_counter,
+    uint mask
+)
+{
+    int i = get_global_id(0);
+    if (i >= n) return;
+    if (type_in[i] == EMPTY) {
+        type_out[i] = EMPTY;
+        return;
+    }
+
+    float3 p = pos_in[i];
+    float3 force = (float3)(0);
+
+    // Central siphon
+    float r_center = length(p) + 1e-10f;
+    // force -= p / (r_center * r_center * r_center);
+
+    // Long-range siphon between particles (tree code, computed on the host)
+    if (use_far) force += far_force[i];
+
+    // Hard shell
+    if (r_center < proton_radius) {
+        float pen = proton_radius - r_center;
+        force += pen * 1e20f * p / r_center;
+    }
+
+    // Boundary forces to keep in first octant
+    if (p.x < proton_radius) force.x += 1e20f;
+    if (p.y < proton_radius) force.y += 1e20f;
+    if (p.z < proton_radius) force.z += 1e20f;
+
+    // Pairwise repulsion + splash count: only the 27 neighbouring cells
+    uchar t = type_in[i];
+    int near = 0;
+    int4 home = cell[i];
+    for (int dx = -1; dx <= 1; dx++)
+    for (int dy = -1; dy <= 1; dy++)
+    for (int dz = -1; dz <= 1; dz++) {
+        int4 nc = home + (int4)(dx, dy, dz, 0);
+        uint h = cell_hash(nc, mask);
+        for (uint k = cell_start[h]; k < cell_end[h]; k++) {
+            int j = cell_index[k];
+            if (i == j) continue;
+            int4 cj = cell[j];
+            if (cj.x != nc.x || cj.y != nc.y || cj.z != nc.z) continue;  // hash collision
+            float3 dp = pos_in[j] - p;
+            float d = length(dp);
+            float r = d + 1e-10f;
+            if (r < proton_radius * 2.0f)
+                force += dp / (r * r * r);
+            if (t == 0 && type_in[j] == 0 && d < L_F * 10.0f)
+                near++;
+        }
+    }
+
+    // Up quark -> neutron
+    if (t == 0 && near >= 2) t = 1;
+
+    // Neutron decay (every 880 frames ≈ 15 min); the electron is spawned in ste_spawn
+    float3 p_new = p;
+    if (t == 1 && (frame_counter + i) % 880 == 0) {
+        t = 2;
+        float3 dir = normalize(p + (float3)(1,1,1));
+        p_new += dir * bohr_radius * 0.1f;
+    }
+
+    float3 v_new = vel_in[i] + force * dt;
+    vel_out[i] = v_new;
+    pos_out[i] = p_new + v_new * dt;
+    type_out[i] = t;
+}
+
+// Reaction pass: each neutron that decayed this step claims slot `rank` of the
+// free-slot list (compacted up quarks, then fresh slots past count[0]).
+// rank/free_list/total come from the spawn scan run after ste_universe; the
+// total is read from its own buffer, since this kernel rewrites type_out.
+__kernel void ste_spawn(
+    __global const float3* pos_in,
+    __global const float3* vel_in,
+    __global const uchar* type_in,
+    __global float3* pos_out,
+    __global float3* vel_out,
+    __global uchar* type_out,
+    __global const ulong* rank,
+    __global const uint* free_list,
+    __global const ulong* total,
+    __global const int* count,
+    int capacity,
+    float bohr_radius
+)
+{
+    int i = get_global_id(0);
+    if (i >= capacity) return;
+    if (type_out[i] != 2 || type_in[i] == 2) return;  // not decayed this step
+
+    uint n_free = (uint)total[0];
+    uint k = (uint)(rank[i] >> 32);
+    int j;
+    if (k < n_free) {
+        j = free_list[k];
+    } else {
+        j = count[0] + (int)(k - n_free);  // fresh slot past the active range
+        if (j >= capacity) return;         // counted as lost by ste_commit
+    }
+
+    float3 p = pos_in[i];
+    float3 dir = normalize(p + (float3)(1,1,1));
+    type_out[j] = 3;
+    pos_out[j] = p - dir * bohr_radius * 0.1f; // opposite direction
+    vel_out[j] = vel_in[i] * 0.1f; // small velocity
+}
+
+// Per-type population count for one frame: a local histogram per work group,
+// then one atomic add per type into series[row].
+__kernel void ste_census(
+    __global const uchar* type,
+    __global uint* series,
+    int row,
+    int capacity,
+    __local uint* counts
+)
+{
+    int lid = get_local_id(0);
+    if (lid < 4) counts[lid] = 0;
+    barrier(CLK_LOCAL_MEM_FENCE);
+    int i = get_global_id(0);
+    if (i < capacity && type[i] < 4) atomic_inc(&counts[type[i]]);
+    barrier(CLK_LOCAL_MEM_FENCE);
+    if (lid < 4 && counts[lid]) atomic_add(&series[4 * row + lid], counts[lid]);
+}
+
+// Gathers particles in sorted-by-type order (index from the type radix sort).
+__kernel void ste_permute(
+    __global const float3* pos,
+    __global const uchar* type,
+    __global const uint* index,
+    __global float3* pos_out,
+    __global uchar* type_out,
+    int n
+)
+{
+    int k = get_global_id(0);
+    if (k >= n) return;
+    pos_out[k] = pos[index[k]];
+    type_out[k] = type[index[k]];
+}
+
+// Copies every stride-th slot into a compact snapshot buffer.
+__kernel void ste_gather(
+    __global const float3* pos,
+    __global const uchar* type,
+    __global float3* pos_out,
+    __global uchar* type_out,
+    int stride,
+    int m
+)
+{
+    int k = get_global_id(0);
+    if (k >= m) return;
+    pos_out[k] = pos[k * stride];
+    type_out[k] = type[k * stride];
+}
+
+// Advances the active count past any fresh slots claimed this step.
+// count[0] = active slots, count[1] = spawns lost to a full pool.
+__kernel void ste_commit(
+    __global const ulong* total,
+    __global int* count,
+    int capacity
+)
+{
+    if (get_global_id(0) != 0) return;
+    int fresh = (int)(total[0] >> 32) - (int)(uint)total[0];
+    if (fresh <= 0) return;
+    int room = capacity - count[0];
+    count[0] += min(fresh, room);
+    count[1] += max(fresh - room, 0);
+}
+"""
+
+
+class _Universe:
+    """Stepping API shared by both backends."""
+
+    frame = 0  # frame counter used when step() is not given one
+
+    def advance(self, steps=1, frame_counter=None, every=0, stride=0, census=0):
+        """
+        Runs `steps` steps back to back with no host round-trips in between.
+        Every `every` steps (0 = never) a report() is collected; stride > 0 adds
+        a decimated snapshot to it. Every `census` steps the per-type counts are
+        recorded (see populations()). Returns the list of reports.
+        """
+        reports = []
+        for k in range(1, steps + 1):
+            self.step(frame_counter)
+            if census and k % census == 0:
+                self.census()
+            if every and k % every == 0:
+                reports.append(self.report(stride))
+        return reports
+
+    def read_by_type(self):
+        """
+        Returns (pos (n, 3), types, bounds) with particles sorted by type:
+        species t is pos[bounds[t]:bounds[t + 1]], a view, not a masked copy.
+        """
+        pos, types = self._sorted_by_type()
+        bounds = np.zeros(5, dtype=np.int64)
+        bounds[1:] = np.cumsum(np.bincount(types, minlength=4)[:4])
+        return pos, types, bounds
+
+    def report(self, stride=0):
+        """
+        Small readback: {'frame', 'counts' (u, n, p, e), 'lo', 'hi'} and, with
+        stride > 0, 'pos'/'types' of every stride-th active slot.
+        """
+        counts, lo, hi = self.summary()
+        rep = {"frame": self.frame, "counts": counts, "lo": lo, "hi": hi}
+        if stride:
+            rep["pos"], rep["types"] = self.snapshot(stride)
+        return rep
+
+    def _frame(self, frame_counter):
+        """Frame for this step: the given one, or the internal counter (then advanced)."""
+        if frame_counter is not None:
+            return frame_counter
+        self.frame += 1
+        return self.frame - 1
+
+
+class NumpyUniverse(_Universe):
+    """
+    CPU backend: vectorized NumPy on float32 structure-of-arrays buffers.
+    pos/vel are stored as (3, capacity) rows of x, y, z; positions() returns an
+    (n, 3) view of the active slots. Each step reads one buffer set and writes
+    the other (ping-pong), so the neighbour pass can be split over `workers`
+    threads with bit-identical results. With grow=True the pool doubles when a
+    spawn needs more slots than `capacity`. integrator is 'leapfrog' or
+    'respa' (`substeps` contact substeps per step); monitor is an optional
+    ste_integrate.EnergyMonitor.
+    """
+
+    def __init__(self, pos, vel, types, dt=0.05, workers=1, block=1 << 14,
+                 capacity=None, grow=True, long_range=None, integrator="leapfrog",
+                 substeps=1, monitor=None):
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"integrator must be one of {INTEGRATORS}, not {integrator!r}")
+        self.integrator = integrator
+        self.substeps = max(int(substeps), 1)
+        self.monitor = monitor
+        self.n = len(types)
+        self.long_range = long_range
+        self.capacity = max(capacity or self.n, self.n, 1)
+        self.grow = grow
+        self.lost = 0
+        self.pos = np.zeros((3, self.capacity), dtype=np.float32)
+        self.vel = np.zeros((3, self.capacity), dtype=np.float32)
+        self.types = np.full(self.capacity, EMPTY, dtype=np.uint8)
+        self.pos[:, :self.n] = np.asarray(pos, dtype=np.float32).T
+        self.vel[:, :self.n] = np.asarray(vel, dtype=np.float32).T
+        self.types[:self.n] = types
+        self._pos_out = np.empty_like(self.pos)
+        self._vel_out = np.empty_like(self.vel)
+        self._types_out = np.empty_like(self.types)
+        self.dt = np.float32(dt)
+        self.cells = CellList(cell_size)
+        self.block = block
+        self.pool = ThreadPoolExecutor(workers) if workers > 1 else None
+        self._census = []
+
+    def positions(self):
+        return self.pos[:, :self.n].T
+
+    def read(self):
+        """Returns (pos (n, 3), types) of the active slots on the host."""
+        return self.pos[:, :self.n].T, self.types[:self.n]
+
+    def _resize(self, capacity):
+        for name in ("pos", "vel", "_pos_out", "_vel_out"):
+            old = getattr(self, name)
+            new = np.zeros((3, capacity), dtype=np.float32)
+            new[:, :self.capacity] = old
+            setattr(self, name, new)
+        for name in ("types", "_types_out"):
+            new = np.full(capacity, EMPTY, dtype=np.uint8)
+            new[:self.capacity] = getattr(self, name)
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def _reserve(self, count):
+        """Claims `count` fresh slots past n, growing the pool if allowed."""
+        need = self.n + max(count, 0)
+        if need > self.capacity and self.grow:
+            self._resize(max(need, 2 * self.capacity))
+        stop = min(need, self.capacity)
+        slots = np.arange(self.n, stop)
+        self.lost += need - stop
+        self.n = stop
+        return slots
+
+    def _block_terms(self, s0, s1, energy=False):
+        """
+        Repulsion force and up-quark neighbour count for the particles
+        order[s0:s1], and with energy=True their share of the pair potential.
+        """
+        f32 = np.float32
+        p = self.pos[:, :self.n]
+        is_up = self.types[:self.n] == UP_QUARK
+        members = self.cells.order[s0:s1]
+        force = np.zeros((3, len(members)))
+        near = np.zeros(len(members), dtype=np.int64)
+        potential = 0.0
+        eps = f32(1e-10)
+        for li, j in self.cells.pairs(s0, s1):
+            dp = p[:, j] - p[:, members[li]]
+            dist = np.sqrt((dp * dp).sum(axis=0))
+            r = dist + eps
+            hit = r < f32(proton_radius * 2.0)
+            if hit.any():
+                w = dp[:, hit] / (r[hit] * r[hit] * r[hit])
+                for k in range(3):
+                    force[k] += np.bincount(li[hit], weights=w[k], minlength=len(members))
+                if energy:
+                    potential += pair_energy(r[hit])
+            splash = (dist < f32(L_F * 10.0)) & is_up[j]
+            if splash.any():
+                near += np.bincount(li[splash], minlength=len(members))
+        return members, force, near, potential
+
+    def _pair_terms(self, energy=False):
+        """
+        Pairwise repulsion force, up-quark neighbour count and (energy=True)
+        pair potential over adjacent cells.
+        """
+        self.cells.build(self.pos[:, :self.n])
+        blocks = self.cells.blocks(self.block)
+        if self.pool is not None:
+            results = self.pool.map(lambda b: self._block_terms(*b, energy), blocks)
+        else:
+            results = (self._block_terms(*b, energy) for b in blocks)
+        force = np.zeros((3, self.n), dtype=np.float32)
+        near = np.zeros(self.n, dtype=np.int64)
+        potential = 0.0
+        for members, f, c, u in results:
+            force[:, members] = f
+            near[members] = c
+            potential += u
+        return force, near, potential
+
+    def summary(self):
+        """Per-type counts (u, n, p, e) and the (lo, hi) corners of the bounding box."""
+        p = self.pos[:, :self.n]
+        counts = np.bincount(self.types[:self.n], minlength=4)[:4]
+        if self.n == 0:
+            return counts, np.full(3, np.inf), np.full(3, -np.inf)
+        return counts, p.min(axis=1), p.max(axis=1)
+
+    def snapshot(self, stride=1):
+        """Copies (pos (m, 3), types) of every stride-th active slot."""
+        return self.pos[:, :self.n:stride].T.copy(), self.types[:self.n:stride].copy()
+
+    def state(self):
+        """Copies everything a step depends on (see ste_checkpoint.py)."""
+        n = self.n
+        return {"pos": self.pos[:, :n].T.copy(), "vel": self.vel[:, :n].T.copy(),
+                "types": self.types[:n].copy(), "frame": self.frame, "dt": self.dt,
+                "capacity": self.capacity, "lost": self.lost, "backend": "cpu"}
+
+    def census(self):
+        """Records this frame's per-type counts."""
+        self._census.append((self.frame, np.bincount(self.types[:self.n], minlength=4)[:4]))
+
+    def populations(self):
+        """Returns (frames (m,), counts (m, 4)) of every census so far."""
+        if not self._census:
+            return np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.int64)
+        frames, counts = zip(*self._census)
+        return np.array(frames), np.array(counts)
+
+    def _sorted_by_type(self):
+        types = self.types[:self.n]
+        order = np.argsort(types, kind="stable")
+        return self.pos[:, order].T, types[order]
+
+    def step(self, frame_counter=None):
+        f32 = np.float32
+        frame_counter = self._frame(frame_counter)
+        n = self.n
+        p, v = self.pos[:, :n], self.vel[:, :n]
+        monitoring = self.monitor is not None and self.monitor.due(frame_counter)
+        force, near, potential = self._pair_terms(energy=monitoring)
+
+        # Hard shell and boundary forces to keep in first octant (sub-cycled by respa)
+        if self.integrator == "leapfrog":
+            add_contact_forces(p, force)
+
+        # Long-range siphon between particles
+        if self.long_range is not None:
+            force += self.long_range.forces(p).astype(np.float32)
+
+        if monitoring:
+            self.monitor.record(frame_counter, kinetic_energy(v, force, self.dt),
+                                potential + contact_energy(p))
+
+        # Up quark -> neutron
+        types = self.types[:n].copy()
+        types[(types == UP_QUARK) & (near >= 2)] = NEUTRON
+
+        # Neutron decay
+        idx = np.arange(n)
+        decay = np.flatnonzero((types == NEUTRON) & ((frame_counter + idx) % DECAY_PERIOD == 0))
+        types[decay] = PROTON
+        kick = np.zeros((3, 0), dtype=np.float32)
+        if len(decay):
+            d = p[:, decay] + f32(1)
+            d /= np.sqrt((d * d).sum(axis=0))
+            kick = d * f32(bohr_radius) * f32(0.1)
+
+        # Free-slot list: remaining up quarks (compaction), then fresh slots.
+        # Reserving may grow the pool, so take the write views afterwards.
+        free = np.flatnonzero(types == UP_QUARK)[:len(decay)]
+        slots = np.concatenate([free, self._reserve(len(decay) - len(free))])
+        src = decay[:len(slots)]
+        p_out, v_out, t_out = self._pos_out, self._vel_out, self._types_out
+
+        # Motion pass: read p/v, write p_out/v_out
+        np.multiply(force, self.dt, out=v_out[:, :n])
+        v_out[:, :n] += v
+        p_out[:, :n] = p
+        p_out[:, decay] += kick
+        if self.integrator == "respa":
+            contact_substeps(p_out[:, :n], v_out[:, :n], self.dt, self.substeps)
+        else:
+            p_out[:, :n] += v_out[:, :n] * self.dt
+        t_out[:n] = types
+        t_out[n:] = self.types[n:]
+
+        # Reaction pass: each decay turns its claimed slot into an electron
+        t_out[slots] = ELECTRON
+        p_out[:, slots] = p[:, src] - kick[:, :len(slots)]
+        v_out[:, slots] = v[:, src] * f32(0.1)
+
+        self.pos, self._pos_out = p_out, self.pos
+        self.vel, self._vel_out = v_out, self.vel
+        self.types, self._types_out = t_out, self.types
+
+
+class OpenCLUniverse(_Universe):
+    """GPU backend: runs the ste_universe kernel through PyOpenCL, ping-ponging two buffer sets."""
+
+    def __init__(self, pos, vel, types, dt=0.05, ctx=None, capacity=None, long_range=None):
+        import pyopencl as cl
+        import pyopencl.array as cl_array
+        from pyopencl.algorithm import RadixSort
+        from pyopencl.reduction import ReductionKernel
+        from pyopencl.scan import GenericScanKernel
+        self.cl = cl
+        self.cl_array = cl_array
+        n = len(types)
+        self.capacity = cap = max(capacity or 2 * n, n, 1)
+        self.dt = np.float32(dt)
+        self.ctx = ctx or cl.create_some_context(interactive=False)
+        self.queue = cl.CommandQueue(self.ctx)
+        self.prg = cl.Program(self.ctx, KERNEL).build()
+
+        pos4 = np.zeros((cap, 4), dtype=np.float32)
+        pos4[:n, :3] = pos
+        vel4 = np.zeros((cap, 4), dtype=np.float32)
+        vel4[:n, :3] = vel
+        t = np.full(cap, EMPTY, dtype=np.uint8)
+        t[:n] = types
+        q = self.queue
+        self.buffers = (cl_array.to_device(q, pos4), cl_array.to_device(q, vel4), cl_array.to_device(q, t))
+        self.buffers_out = tuple(cl_array.empty_like(a) for a in self.buffers)
+        self.count = cl_array.to_device(q, np.array([n, 0], dtype=np.int32))  # active, lost
+        self.long_range = long_range
+        self.far = cl_array.zeros(q, (cap, 4), np.float32)
+
+        # Cell list: hash per particle, radix-sorted each step
+        size = table_size(cap)
+        self.mask = np.uint32(size - 1)
+        self.key_bits = size.bit_length()  # room for the EMPTY key, mask + 1
+        self.cell = cl_array.empty(q, 4 * cap, np.int32)  # int4 per slot
+        self.cell_key = cl_array.empty(q, cap, np.uint32)
+        self.cell_index = cl_array.empty(q, cap, np.uint32)
+        self.cell_start = cl_array.zeros(q, size, np.uint32)
+        self.cell_end = cl_array.zeros(q, size, np.uint32)
+        self.sorter = RadixSort(self.ctx, "uint *keys, uint *values",
+                                key_expr="keys[i]", sort_arg_names=["keys", "values"])
+
+        # Free-slot compaction: exclusive scan of SPAWN_FLAGS gives each decay its
+        # rank and each remaining up quark its place in free_list; the total
+        # (decays << 32 | free up quarks) goes to spawn_total before ste_spawn runs
+        self.rank = cl_array.empty(q, cap, np.uint64)
+        self.free_list = cl_array.empty(q, cap, np.uint32)
+        self.spawn_total = cl_array.empty(q, 1, np.uint64)
+        self.spawn_scan = GenericScanKernel(
+            self.ctx, np.uint64,
+            arguments="__global const uchar *type_in, __global const uchar *type_out, "
+                      "__global ulong *rank, __global uint *free_list, __global ulong *total",
+            input_expr="SPAWN_FLAGS(type_in[i], type_out[i])",
+            scan_expr="a+b", neutral="0",
+            output_statement="rank[i] = prev_item; "
+                             "if (type_out[i] == 0) free_list[(uint)prev_item] = i; "
+                             "if (i == 0) total[0] = last_item;",
+            preamble=SPAWN_SOURCE)
+
+        # Reports: per-type counts and bounding box as device reductions
+        self.count_types = ReductionKernel(
+            self.ctx, cl.cltypes.uint4, neutral="(uint4)(0)", reduce_expr="a+b",
+            map_expr="(uint4)(t[i] == 0, t[i] == 1, t[i] == 2, t[i] == 3)",
+            arguments="__global const uchar *t")
+        self.pos_min, self.pos_max = (ReductionKernel(
+            self.ctx, cl.cltypes.float4, neutral=f"(float4)({inf})", reduce_expr=f"{op}(a, b)",
+            map_expr=f"t[i] == EMPTY ? (float4)({inf}) : vload4(i, p)",
+            arguments="__global const float *p, __global const uchar *t", preamble=SPAWN_SOURCE)
+            for op, inf in (("fmin", "INFINITY"), ("fmax", "-INFINITY")))
+
+        # Census rows accumulate on the device, CENSUS_ROWS at a time
+        self.census_rows = cl_array.zeros(q, (CENSUS_ROWS, 4), np.uint32)
+        self._census_row = 0
+        self._census_frames = []
+        self._census_host = []
+        self.type_sorter = RadixSort(self.ctx, "const uchar *t, uint *index",
+                                     key_expr="t[i]", sort_arg_names=["index"])
+
+    @property
+    def n(self):
+        return int(self.count.get(queue=self.queue)[0])
+
+    @property
+    def lost(self):
+        return int(self.count.get(queue=self.queue)[1])
+
+    @lost.setter
+    def lost(self, value):
+        self.count.set(np.array([self.n, value], dtype=np.int32), queue=self.queue)
+
+    def _build_cells(self):
+        cap = np.int32(self.capacity)
+        pos, _, types = self.buffers
+        self.prg.cell_assign(self.queue, (self.capacity,), None,
+                             pos.data, types.data, self.cell.data,
+                             self.cell_key.data, self.cell_index.data,
+                             cap, np.float32(cell_size), self.mask)
+        (keys, index), _ = self.sorter(self.cell_key, self.cell_index,
+                                       key_bits=self.key_bits, queue=self.queue)
+        self.cell_start.fill(0)
+        self.cell_end.fill(0)
+        self.prg.cell_bounds(self.queue, (self.capacity,), None,
+                             keys.data, self.cell_start.data, self.cell_end.data, cap, self.mask)
+        return index
+
+    def step(self, frame_counter=None):
+        frame_counter = self._frame(frame_counter)
+        index = self._build_cells()
+        cap = np.int32(self.capacity)
+        if self.long_range is not None:
+            n = self.n
+            far = np.zeros((self.capacity, 4), dtype=np.float32)
+            far[:n, :3] = self.long_range.forces(self.buffers[0].get(queue=self.queue)[:n, :3].T).T
+            self.far.set(far, queue=self.queue)
+        state_in = [a.data for a in self.buffers]
+        state_out = [a.data for a in self.buffers_out]
+        self.prg.ste_universe(self.queue, (self.capacity,), None,
+                              *state_in, *state_out,
+                              self.cell.data, index.data, self.cell_start.data, self.cell_end.data,
+                              self.far.data, np.int32(self.long_range is not None),
+                              self.dt, cap,
+                              np.float32(proton_radius), np.float32(L_F),
+                              np.float32(bohr_radius), np.int32(frame_counter), self.mask)
+
+        # Reaction pass: compact free slots, spawn electrons, advance the active count
+        t_in, t_out = self.buffers[2], self.buffers_out[2]
+        self.spawn_scan(t_in, t_out, self.rank, self.free_list, self.spawn_total, queue=self.queue)
+        self.prg.ste_spawn(self.queue, (self.capacity,), None, *state_in, *state_out,
+                           self.rank.data, self.free_list.data, self.spawn_total.data,
+                           self.count.data, cap, np.float32(bohr_radius))
+        self.prg.ste_commit(self.queue, (1,), None, self.spawn_total.data, self.count.data, cap)
+        self.buffers, self.buffers_out = self.buffers_out, self.buffers
+
+    def summary(self):
+        """Per-type counts (u, n, p, e) and the (lo, hi) bounding box, reduced on the device."""
+        pos, _, types = self.buffers
+        counts = self.count_types(types, queue=self.queue).get().reshape(1).view(np.uint32)
+        lo = self.pos_min(pos, types, queue=self.queue).get().reshape(1).view(np.float32)
+        hi = self.pos_max(pos, types, queue=self.queue).get().reshape(1).view(np.float32)
+        return counts.astype(np.int64), lo[:3], hi[:3]
+
+    def snapshot(self, stride=1):
+        """Gathers (pos (m, 3), types) of every stride-th active slot on the device, then copies."""
+        m = -(-self.n // stride)
+        if m == 0:
+            return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.uint8)
+        pos, _, types = self.buffers
+        out_pos = self.cl_array.empty(self.queue, (m, 4), np.float32)
+        out_types = self.cl_array.empty(self.queue, m, np.uint8)
+        self.prg.ste_gather(self.queue, (m,), None, pos.data, types.data,
+                            out_pos.data, out_types.data, np.int32(stride), np.int32(m))
+        return out_pos.get(queue=self.queue)[:, :3], out_types.get(queue=self.queue)
+
+    def state(self):
+        """Copies everything a step depends on back to the host (see ste_checkpoint.py)."""
+        n, lost = (int(v) for v in self.count.get(queue=self.queue))
+        pos4, vel4, types = (a.get(queue=self.queue) for a in self.buffers)
+        return {"pos": pos4[:n, :3], "vel": vel4[:n, :3], "types": types[:n],
+                "frame": self.frame, "dt": self.dt, "capacity": self.capacity, "lost": lost,
+                "backend": "opencl"}
+
+    def census(self):
+        """Records this frame's per-type counts into a device row (no readback)."""
+        if self._census_row == CENSUS_ROWS:
+            self._flush_census()
+        groups = -(-self.capacity // 256)
+        self.prg.ste_census(self.queue, (groups * 256,), (256,),
+                            self.buffers[2].data, self.census_rows.data, np.int32(self._census_row),
+                            np.int32(self.capacity), self.cl.LocalMemory(16))
+        self._census_row += 1
+        self._census_frames.append(self.frame)
+
+    def _flush_census(self):
+        if self._census_row:
+            rows = self.census_rows.get(queue=self.queue)[:self._census_row]
+            self._census_host.append(rows.astype(np.int64))
+            self.census_rows.fill(0)
+            self._census_row = 0
+
+    def populations(self):
+        """Returns (frames (m,), counts (m, 4)) of every census so far."""
+        self._flush_census()
+        if not self._census_host:
+            return np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.int64)
+        return np.array(self._census_frames), np.concatenate(self._census_host)
+
+    def _sorted_by_type(self):
+        n = self.n
+        pos, _, types = self.buffers
+        index = self.cl_array.arange(self.queue, self.capacity, dtype=np.uint32)
+        (index,), _ = self.type_sorter(types, index, key_bits=8, queue=self.queue)
+        out_pos = self.cl_array.empty(self.queue, (max(n, 1), 4), np.float32)
+        out_types = self.cl_array.empty(self.queue, max(n, 1), np.uint8)
+        if n:
+            self.prg.ste_permute(self.queue, (n,), None, pos.data, types.data, index.data,
+                                 out_pos.data, out_types.data, np.int32(n))
+        return out_pos.get(queue=self.queue)[:n, :3], out_types.get(queue=self.queue)[:n]
+
+    def positions(self):
+        return self.read()[0]
+
+    def read(self):
+        """Copies (pos (n, 3), types) of the active slots back to the host."""
+        n = self.n
+        pos4 = self.buffers[0].get(queue=self.queue)
+        types = self.buffers[2].get(queue=self.queue)
+        return pos4[:n, :3], types[:n]
+
+    def velocities(self):
+        return self.buffers[1].get(queue=self.queue)[:self.n, :3]
+
+
+def make_universe(pos, vel, types, dt=0.05, backend="auto", workers=1, capacity=None,
+                  long_range=None, integrator="leapfrog", substeps=1, monitor=None):
+    """
+    Picks a backend: 'opencl', 'cpu', or 'auto' (OpenCL if a device is usable,
+    otherwise NumPy). `workers` threads split the NumPy neighbour pass.
+    `capacity` is the pool size (default 2n on OpenCL; NumPy grows as needed).
+    `long_range` is an optional far-field solver such as ste_octree.BarnesHut.
+    integrator='respa' and `monitor` (see ste_integrate.py) need NumPy, so
+    'auto' picks it for them.
+    """
+    cpu = dict(workers=workers, capacity=capacity, long_range=long_range,
+               integrator=integrator, substeps=substeps, monitor=monitor)
+    gpu = dict(capacity=capacity, long_range=long_range)
+    cpu_only = integrator != "leapfrog" or monitor is not None
+    if backend == "cpu" or (backend == "auto" and cpu_only):
+        return NumpyUniverse(pos, vel, types, dt=dt, **cpu)
+    if backend == "opencl":
+        if cpu_only:
+            raise ValueError("the OpenCL backend runs leapfrog only, without an energy monitor")
+        return OpenCLUniverse(pos, vel, types, dt=dt, **gpu)
+    try:
+        return OpenCLUniverse(pos, vel, types, dt=dt, **gpu)
+    except Exception as exc:  # no pyopencl, no platform, no device
+        print(f"OpenCL unavailable ({exc.__class__.__name__}), using NumPy backend.")
+        return NumpyUniverse(pos, vel, types, dt=dt, **cpu)
+
+
+def from_state(state, backend="auto", workers=1, long_range=None, integrator="leapfrog",
+               substeps=1, monitor=None):
+    """
+    Rebuilds a universe from state() / a loaded checkpoint; on the backend
+    that saved it, stepping continues bit-identically. The NumPy capacity is
+    only its current allocation, so a state without an OpenCL pool size gets
+    at least the OpenCL default of 2n (NumPy just starts with more room).
+    """
+    capacity = int(state["capacity"])
+    if str(state.get("backend", "cpu")) != "opencl":
+        capacity = max(capacity, 2 * len(state["types"]))
+    universe = make_universe(state["pos"], state["vel"], state["types"], dt=float(state["dt"]),
+                             backend=backend, workers=workers,
+                             capacity=capacity, long_range=long_range,
+                             integrator=integrator, substeps=substeps, monitor=monitor)
+    universe.frame = int(state["frame"])
+    universe.lost = int(state["lost"])
+    return universe
+
+
+def check_agreement(pos_a, pos_b, types_a=None, types_b=None,
+                    rtol=POS_RTOL, atol=POS_ATOL):
+    """
+    Checks one backend's output against another's within the documented tolerance.
+    Returns (ok, max_excess) where max_excess <= 0 means every element is inside
+    the tolerance band.
+    """
+    a = np.asarray(pos_a, dtype=np.float64)
+    b = np.asarray(pos_b, dtype=np.float64)
+    band = rtol * np.maximum(np.abs(a), np.abs(b)) + atol
+    excess = float(np.max(np.abs(a - b) - band)) if a.size else 0.0
+    ok = excess <= 0
+    if types_a is not None and types_b is not None:
+        ok = ok and np.array_equal(types_a, types_b)
+    return ok, excess